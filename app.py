@@ -1,15 +1,41 @@
 import os
+import json
+import asyncio
+import codecs
+import base64
+import time
 import uuid
-from typing import List, Optional, Literal
+import itertools
+from collections import deque
+from typing import Dict, List, Optional, Literal, Union
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Depends,
+    Security,
+    Query,
+    Body,
+    Request,
+    Response,
+    Header,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, field_validator
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import Json, execute_values
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-import jwt
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager, contextmanager
+from pool import ConnectionPool, PoolTimeout
+from events import ChangeListener, notify
+from snapshot import SnapshotCache
+from compression import choose_encoding, encoded_body
+from slowlog import SlowQueryLog
+from table import SCHEMA, UNIFIED_TABLE
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -26,7 +52,66 @@ JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_WEEKS = 99999
 
-app = FastAPI(title="Song Manager API")
+# Connection pool settings
+POOL_MIN_SIZE = int(os.getenv("SONGLIST_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("SONGLIST_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("SONGLIST_POOL_TIMEOUT", "5"))
+POOL_CHECK_AFTER = float(os.getenv("SONGLIST_POOL_CHECK_AFTER", "30"))
+POOL_MAX_USES = int(os.getenv("SONGLIST_POOL_MAX_USES", "1000"))
+POOL_MAX_AGE = float(os.getenv("SONGLIST_POOL_MAX_AGE", "1800"))
+# Open min_size connections at import, before the first request arrives
+POOL_PREWARM = os.getenv("SONGLIST_POOL_PREWARM", "0") == "1"
+
+# Live updates
+CHANGES_CHANNEL = "song_changes"
+LISTEN_ENABLED = os.getenv("SONGLIST_LISTEN", "1") == "1"
+SSE_KEEPALIVE = 15.0
+
+# Snapshot cache settings, 0 disables the cache
+SNAPSHOT_MAX_AGE = float(os.getenv("SONGLIST_SNAPSHOT_MAX_AGE", "60"))
+# Concurrent list reads that miss the cache share one query. A finished
+# query is also shared for COALESCE_WINDOW seconds, unless a write lands.
+COALESCE_ENABLED = os.getenv("SONGLIST_COALESCE", "1") == "1"
+COALESCE_WINDOW = float(os.getenv("SONGLIST_COALESCE_WINDOW", "0"))
+
+# Pagination settings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_SEARCH_LIMIT = 100
+
+# Batch settings
+MAX_BATCH_SIZE = 1000
+DELETE_CHUNK_SIZE = 5000
+EXPORT_ITERSIZE = 2000
+
+# Change feed settings
+MAX_CHANGES = 10000
+
+# Random pick settings
+MAX_RANDOM_PICKS = 100
+RANDOM_EXACT_LIMIT = 1000
+RANDOM_SAMPLE_ROWS = 50
+RANDOM_SAMPLE_PAGES_PER_PICK = 4
+RANDOM_COUNT_LIMIT = 100000
+RANDOM_RECENT_SIZE = int(os.getenv("SONGLIST_RANDOM_RECENT", "50"))
+
+# Slow query log settings, a threshold of 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SONGLIST_SLOW_QUERY_MS", "0"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SONGLIST_SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SONGLIST_SLOW_QUERY_LOG_SIZE", "100"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool.fill()
+    if LISTEN_ENABLED:
+        listener.start(asyncio.get_running_loop())
+    yield
+    listener.stop()
+    pool.close()
+
+
+app = FastAPI(title="Song Manager API", lifespan=lifespan)
 
 
 # Add CORS middleware here
@@ -37,6 +122,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 # Auth Models
@@ -54,7 +140,11 @@ class Token(BaseModel):
 security = HTTPBearer()
 
 
+# jwt and importer are imported where they are used: GET requests need
+# neither, and every import adds to the cold start of a serverless instance
 def create_access_token(data: dict):
+    import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(weeks=JWT_EXPIRATION_WEEKS)
     to_encode.update({"exp": expire})
@@ -63,6 +153,8 @@ def create_access_token(data: dict):
 
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    import jwt
+
     try:
         token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -138,31 +230,282 @@ class Song(SongBase):
     uuid: str
 
 
+class SongPage(BaseModel):
+    items: List[Song]
+    next_cursor: Optional[str] = None
+
+
+class Facets(BaseModel):
+    tags: Dict[str, int]
+    singers: Dict[str, int]
+
+
 class MoveSongs(BaseModel):
     moveto: Literal["todo-songs", "songs-todo"]
     uuids: List[str]
 
 
+slow_queries = SlowQueryLog(
+    SLOW_QUERY_MS / 1000, SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_LOG_SIZE
+)
+if SLOW_QUERY_MS > 0:
+    metrics.TimedCursor.slow_log = slow_queries
+
+
 # Database functions
 def get_db_connection():
-    conn = psycopg2.connect(db_connection_string, cursor_factory=RealDictCursor)
+    conn = psycopg2.connect(db_connection_string, cursor_factory=metrics.TimedCursor)
     conn.autocommit = True
     return conn
 
 
-def get_db():
-    conn = get_db_connection()
+pool = ConnectionPool(
+    get_db_connection,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    timeout=POOL_TIMEOUT,
+    check_after=POOL_CHECK_AFTER,
+    max_uses=POOL_MAX_USES,
+    max_age=POOL_MAX_AGE,
+)
+
+# The pool lives at module scope, so a warm serverless instance reuses its
+# connections across invocations. Prewarming moves the first connect into
+# instance startup, which also covers hosts that never run the lifespan hook.
+if POOL_PREWARM:
+    try:
+        pool.fill()
+    except psycopg2.Error:
+        pass
+
+
+listener = ChangeListener(
+    lambda: psycopg2.connect(db_connection_string), CHANGES_CHANNEL
+)
+
+
+# Whole-table reads, kept per worker. This worker's writes drop entries
+# directly; other workers' writes arrive through the listener.
+snapshots = SnapshotCache(SNAPSHOT_MAX_AGE, COALESCE_ENABLED, COALESCE_WINDOW)
+
+
+def invalidate_snapshots(payload):
+    try:
+        change = json.loads(payload)
+    except ValueError:
+        return
+    if not isinstance(change, dict):
+        # Not one of ours, e.g. a bare NOTIFY from psql
+        return
+    if change.get("op") == "reset":
+        snapshots.invalidate()
+        return
+    tables = [table for table in (change.get("table"), change.get("source")) if table]
+    if tables:
+        snapshots.invalidate(*tables)
+
+
+listener.add_callback(invalidate_snapshots)
+
+
+def acquire_db():
+    """Take a pooled connection, timing the wait; 503 if none frees up."""
+    start = time.perf_counter()
+    try:
+        return pool.getconn()
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database is busy")
+    finally:
+        metrics.pool_acquire_duration.observe(time.perf_counter() - start)
+
+
+@contextmanager
+def borrow_db():
+    conn = acquire_db()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.putconn(conn)
 
 
-# Routes
-@app.get("/songs/", response_model=List[Song])
-async def get_songs(db: psycopg2.extensions.connection = Depends(get_db)):
+def get_db():
+    with borrow_db() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction(db):
+    """
+    Run the enclosed statements as one transaction on an autocommit pooled
+    connection: commit if the block succeeds, roll back if it raises.
+    """
+    db.autocommit = False
+    try:
+        with db:
+            yield
+    finally:
+        db.autocommit = True
+
+
+def parse_uuids(uuids):
+    """
+    Map each well-formed request uuid to its canonical form. Malformed ones
+    can never match a row, so they are left out instead of failing the query.
+    """
+    parsed = {}
+    for song_uuid in uuids:
+        try:
+            parsed[song_uuid] = str(uuid.UUID(song_uuid))
+        except ValueError:
+            pass
+    return parsed
+
+
+# Stats
+@app.get("/stats")
+async def get_stats(_: dict = Depends(verify_token)):
+    return {
+        "pool": pool.stats(),
+        "snapshots": snapshots.stats(),
+        "listener": {
+            "subscribers": listener.subscribers,
+            "delivered": listener.delivered,
+            "reconnects": listener.reconnects,
+        },
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(_: dict = Depends(verify_token)):
+    """Prometheus text format; scrape with this API's bearer token."""
+    pool_stats = pool.stats()
+    snapshot_stats = snapshots.stats()
+    values = {
+        "songlist_pool_size": ("gauge", pool_stats["size"]),
+        "songlist_pool_in_use": ("gauge", pool_stats["in_use"]),
+        "songlist_pool_waits_total": ("counter", pool_stats["waits"]),
+        "songlist_pool_timeouts_total": ("counter", pool_stats["timeouts"]),
+        "songlist_snapshot_hits_total": ("counter", snapshot_stats["hits"]),
+        "songlist_snapshot_misses_total": ("counter", snapshot_stats["misses"]),
+        "songlist_snapshot_coalesced_total": ("counter", snapshot_stats["coalesced"]),
+        "songlist_sse_subscribers": ("gauge", listener.subscribers),
+    }
+    return PlainTextResponse(
+        metrics.render(values), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/admin/slow-queries")
+async def get_slow_queries(_: dict = Depends(verify_token)):
+    return {
+        "enabled": metrics.TimedCursor.slow_log is not None,
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain_rate": SLOW_QUERY_EXPLAIN_RATE,
+        "recorded": slow_queries.recorded,
+        "entries": slow_queries.entries(),
+    }
+
+
+@app.delete("/admin/slow-queries")
+async def clear_slow_queries(_: dict = Depends(verify_token)):
+    slow_queries.clear()
+    return {"status": "ok"}
+
+
+# Pagination
+# Each sort order is backed by an index on (key, uuid), see table.py
+PAGE_SORT_KEYS = {
+    "name": "data->>'name'",
+    "created": "created_at",
+}
+
+
+def encode_cursor(order, value, song_uuid):
+    raw = json.dumps([order, value, song_uuid]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, order):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order, value, song_uuid = json.loads(raw)
+        uuid.UUID(song_uuid)
+        # The value is sent to Postgres as is, so it must be a sort key it accepts
+        if not isinstance(value, str) or "\x00" in value:
+            raise ValueError("Invalid sort value")
+        if order == "created":
+            datetime.fromisoformat(value)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if cursor_order != order:
+        raise HTTPException(
+            status_code=400, detail="Cursor was issued for another order"
+        )
+
+    return value, song_uuid
+
+
+def fetch_song_page(db, table, limit, cursor, order):
+    sort_key = PAGE_SORT_KEYS[order]
+    query = f"SELECT uuid, data, {sort_key} AS sort_value FROM {table}"
+    params = []
+
+    if cursor is not None:
+        value, after_uuid = decode_cursor(cursor, order)
+        query += f" WHERE ({sort_key}, uuid) > (%s, %s::uuid)"
+        params += [value, after_uuid]
+
+    # Fetch one extra row to find out whether there is a next page
+    query += f" ORDER BY {sort_key}, uuid LIMIT %s"
+    params.append(limit + 1)
+
+    db_cursor = db.cursor()
+    db_cursor.execute(query, params)
+    results = db_cursor.fetchall()
+    db_cursor.close()
+
+    songs = []
+    for row in results[:limit]:
+        song_data = row["data"]
+        song_data["uuid"] = str(row["uuid"])
+        songs.append(Song(**song_data))
+
+    next_cursor = None
+    if len(results) > limit:
+        last = results[limit - 1]
+        value = last["sort_value"]
+        if order == "created":
+            value = value.isoformat()
+        next_cursor = encode_cursor(order, value, str(last["uuid"]))
+
+    return SongPage(items=songs, next_cursor=next_cursor)
+
+
+# Search
+# Each condition is served by an index from table.py: trigram on the name,
+# GIN containment on the singers and tags arrays
+SEARCH_CONDITIONS = {
+    "name": "data->>'name' ILIKE %s",
+    "singer": "data->'singers' @> %s::jsonb",
+    "tag": "data->'tags' @> %s::jsonb",
+}
+
+
+def search_songs(db, table, q, search_type, limit):
+    if search_type == "name":
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        param = f"%{escaped}%"
+    else:
+        param = json.dumps([q])
+
+    # No ORDER BY: sorting in SQL would tempt the planner into walking the
+    # name index and filtering every row instead of using the search index
     cursor = db.cursor()
-    cursor.execute("SELECT uuid, data FROM songs")
+    cursor.execute(
+        f"SELECT uuid, data FROM {table} WHERE {SEARCH_CONDITIONS[search_type]} LIMIT %s",
+        (param, limit),
+    )
     results = cursor.fetchall()
     cursor.close()
 
@@ -172,28 +515,565 @@ async def get_songs(db: psycopg2.extensions.connection = Depends(get_db)):
         song_data["uuid"] = str(row["uuid"])
         songs.append(Song(**song_data))
 
+    songs.sort(key=lambda song: (song.name, song.uuid))
     return songs
 
 
-@app.get("/todo/", response_model=List[Song])
-async def get_todo_songs(db: psycopg2.extensions.connection = Depends(get_db)):
+# Facets
+def fetch_facets(db, table):
+    """Song counts per tag and per singer, most common first."""
     cursor = db.cursor()
-    cursor.execute("SELECT uuid, data FROM todo_songs")
+    cursor.execute(
+        """
+        SELECT kind, value, song_count FROM song_facets
+        WHERE table_name = %s
+        ORDER BY song_count DESC, value
+        """,
+        (table,),
+    )
     results = cursor.fetchall()
     cursor.close()
 
+    facets = {"tags": {}, "singers": {}}
+    for row in results:
+        facets[f"{row['kind']}s"][row["value"]] = row["song_count"]
+    return facets
+
+
+# Random picks
+# Recently picked uuids per table, per worker
+recent_picks = {
+    "songs": deque(maxlen=RANDOM_RECENT_SIZE),
+    "todo_songs": deque(maxlen=RANDOM_RECENT_SIZE),
+}
+
+
+def estimate_matches(cursor, table, facets):
+    """
+    Estimate how many songs carry every (kind, value) in facets, from the
+    planner's row count and the exact facet counts, assuming independence.
+    A table without statistics is counted up to RANDOM_COUNT_LIMIT rows.
+    """
+    # A view has no statistics; the list's partial index counts its rows
+    relation = table
+    if SCHEMA == "unified":
+        relation = f"{UNIFIED_TABLE}_{table}_created_idx"
+    cursor.execute(
+        "SELECT reltuples::bigint AS total FROM pg_class WHERE oid = %s::regclass",
+        (relation,),
+    )
+    total = cursor.fetchone()["total"]
+    if total <= 0:
+        # Empty, or not analyzed since it was filled, e.g. right after an
+        # import. Capped, so a big table is taken to have at least the cap.
+        cursor.execute(
+            f"SELECT count(*) AS total FROM (SELECT 1 FROM {table} LIMIT %s) s",
+            (RANDOM_COUNT_LIMIT,),
+        )
+        total = cursor.fetchone()["total"]
+        if total == 0:
+            return 0
+
+    estimate = total
+    for kind, value in facets:
+        cursor.execute(
+            """
+            SELECT song_count FROM song_facets
+            WHERE table_name = %s AND kind = %s AND value = %s
+            """,
+            (table, kind, value),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        estimate = estimate * row["song_count"] / total
+    return estimate
+
+
+def sample_songs(cursor, table, conditions, params, n, estimate):
+    """
+    Pick n random rows matching conditions. Few matches are shuffled exactly
+    through the search indexes. Many are sampled with TABLESAMPLE SYSTEM,
+    then shuffled, so no query sorts the whole table. SYSTEM reads whole
+    pages, whose rows were often written together, so the sample is sized
+    to cover RANDOM_SAMPLE_PAGES_PER_PICK pages per pick as well as about
+    RANDOM_SAMPLE_ROWS matches. Every match on the sampled pages is kept,
+    so each one is equally likely to be picked. The sample is grown if it
+    comes up short.
+    """
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    relation = table
+    sampled_where = where
+    if SCHEMA == "unified":
+        # TABLESAMPLE cannot sample a view, so sample the list's table
+        relation = UNIFIED_TABLE
+        sampled_conditions = [f"status = '{table}'"] + conditions
+        sampled_where = f" WHERE {' AND '.join(sampled_conditions)}"
+
+    percent = 100.0
+    if estimate > RANDOM_EXACT_LIMIT:
+        cursor.execute(
+            """
+            SELECT pg_relation_size(%s::regclass)
+                / current_setting('block_size')::integer AS pages
+            """,
+            (relation,),
+        )
+        pages = max(cursor.fetchone()["pages"], 1)
+        percent = max(
+            100.0 * max(RANDOM_SAMPLE_ROWS, n * 4) / estimate,
+            100.0 * n * RANDOM_SAMPLE_PAGES_PER_PICK / pages,
+        )
+
+    while True:
+        if percent >= 100:
+            cursor.execute(
+                f"SELECT uuid, data FROM {table}{where} ORDER BY random() LIMIT %s",
+                params + [n],
+            )
+            return cursor.fetchall()
+
+        cursor.execute(
+            f"""
+            SELECT uuid, data FROM {relation} TABLESAMPLE SYSTEM (%s){sampled_where}
+            ORDER BY random() LIMIT %s
+            """,
+            [percent] + params + [n],
+        )
+        results = cursor.fetchall()
+        if len(results) >= n:
+            return results
+        percent *= 4
+
+
+def pick_random_songs(db, table, tag, singer, n, avoid_recent):
+    conditions = []
+    params = []
+    facets = []
+    if tag is not None:
+        conditions.append(SEARCH_CONDITIONS["tag"])
+        params.append(json.dumps([tag]))
+        facets.append(("tag", tag))
+    if singer is not None:
+        conditions.append(SEARCH_CONDITIONS["singer"])
+        params.append(json.dumps([singer]))
+        facets.append(("singer", singer))
+
+    cursor = db.cursor()
+    estimate = estimate_matches(cursor, table, facets)
+    results = []
+    if estimate != 0:
+        exclude = list(recent_picks[table]) if avoid_recent else []
+        results = sample_songs(
+            cursor,
+            table,
+            conditions + ["uuid <> ALL(%s::uuid[])"],
+            params + [exclude],
+            n,
+            estimate,
+        )
+        if len(results) < n and exclude:
+            # Every match was picked recently: repeat some rather than come up short
+            exclude = [str(row["uuid"]) for row in results]
+            results += sample_songs(
+                cursor,
+                table,
+                conditions + ["uuid <> ALL(%s::uuid[])"],
+                params + [exclude],
+                n - len(results),
+                estimate,
+            )
+    cursor.close()
+
     songs = []
     for row in results:
         song_data = row["data"]
         song_data["uuid"] = str(row["uuid"])
         songs.append(Song(**song_data))
-
+        recent_picks[table].append(song_data["uuid"])
     return songs
 
 
+# Export
+def stream_ndjson(conn, table):
+    """
+    Yield every song of table as NDJSON, EXPORT_ITERSIZE rows at a time, from
+    a named server-side cursor, so memory use does not depend on table size.
+    The generator takes over conn, because it outlives the route, and returns
+    it to the pool when it ends or is closed.
+    """
+    try:
+        with transaction(conn):
+            cursor = conn.cursor(name=f"export_{table}")
+            cursor.itersize = EXPORT_ITERSIZE
+            cursor.execute(f"SELECT uuid, data FROM {table}")
+            while True:
+                rows = cursor.fetchmany(EXPORT_ITERSIZE)
+                if not rows:
+                    break
+                lines = []
+                for row in rows:
+                    song_data = row["data"]
+                    song_data["uuid"] = str(row["uuid"])
+                    lines.append(json.dumps(song_data))
+                yield "\n".join(lines) + "\n"
+            cursor.close()
+    finally:
+        pool.putconn(conn)
+
+
+def export_response(table):
+    """
+    Borrow the connection in the route, so an exhausted pool is a 503 before
+    the response starts, as on other routes. Reading the first chunk here
+    enters the stream's cleanup, so the connection is returned even if the
+    response is never sent, and query errors are still a 500.
+    """
+    stream = stream_ndjson(acquire_db(), table)
+    first = next(stream, "")
+    return StreamingResponse(
+        itertools.chain([first], stream), media_type="application/x-ndjson"
+    )
+
+
+# Change feed
+def fetch_changes(db, since):
+    """
+    Return the current state of every song written or deleted since the sync
+    token `since`. Tokens are transaction-id horizons: everything older than
+    the horizon has committed, so no change can slip in behind a token.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS horizon")
+    horizon = cursor.fetchone()["horizon"]
+
+    if since is None:
+        cursor.close()
+        return {"token": horizon, "reset": False, "changes": []}
+
+    window = "change_xid >= %(since)s::xid8 AND change_xid < %(horizon)s::xid8"
+    cursor.execute(
+        f"""
+        SELECT 'songs' AS table_name, uuid, data FROM songs WHERE {window}
+        UNION ALL
+        SELECT 'todo_songs', uuid, data FROM todo_songs WHERE {window}
+        UNION ALL
+        SELECT table_name, uuid, NULL FROM song_tombstones WHERE {window}
+        LIMIT %(limit)s
+        """,
+        {"since": since, "horizon": horizon, "limit": MAX_CHANGES + 1},
+    )
+    results = cursor.fetchall()
+    cursor.close()
+
+    # Too far behind: cheaper for the client to refetch the lists
+    if len(results) > MAX_CHANGES:
+        return {"token": horizon, "reset": True, "changes": []}
+
+    changes = []
+    for row in results:
+        change = {"table": row["table_name"], "uuid": str(row["uuid"])}
+        if row["data"] is None:
+            change["op"] = "delete"
+        else:
+            change["op"] = "upsert"
+            change["song"] = {**row["data"], "uuid": change["uuid"]}
+        changes.append(change)
+
+    return {"token": horizon, "reset": False, "changes": changes}
+
+
+@app.get("/changes")
+def get_changes(
+    since: Optional[str] = None,
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    """
+    Without `since`, return the current sync token. Take it before loading
+    the lists, then pass the latest token back to receive only what changed.
+    Changes may be delivered more than once; applying them is idempotent.
+    """
+    if since is not None and not since.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return fetch_changes(db, since)
+
+
+# Live updates
+@app.get("/events")
+async def stream_events():
+    """
+    Server-Sent Events: one "change" event per write, carrying the NOTIFY
+    payload. All clients of a worker share that worker's single LISTEN
+    connection. Clients fetch the actual data from /changes.
+    """
+    queue = listener.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: change\ndata: {payload}\n\n"
+        finally:
+            listener.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def fetch_list_version(cursor, table):
+    cursor.execute(
+        "SELECT version FROM song_list_versions WHERE table_name = %s", (table,)
+    )
+    return cursor.fetchone()["version"]
+
+
+def load_songs(table):
+    """
+    Return (version, body) for the whole table, read from one snapshot. The
+    JSON array is assembled by Postgres: rows were validated on write, so
+    parsing them into models only to encode them again is wasted work.
+    """
+    with borrow_db() as db:
+        with transaction(db):
+            cursor = db.cursor()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            version = fetch_list_version(cursor, table)
+            cursor.execute(f"""
+                SELECT coalesce(
+                    json_agg(data || jsonb_build_object('uuid', uuid)), '[]'
+                )::text AS body
+                FROM {table}
+            """)
+            body = cursor.fetchone()["body"]
+            cursor.close()
+
+    # Compressed variants are added on first use, see list_response
+    return version, {"identity": body.encode()}
+
+
+def etag_matches(if_none_match, version):
+    """True if If-None-Match names version in any encoding."""
+    if if_none_match is None:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == "*" or tag.split("-")[0] == str(version):
+            return True
+    return False
+
+
+def list_headers(version, encoding):
+    # Each encoding is its own representation, so it gets its own strong ETag
+    etag = f'"{version}"' if encoding == "identity" else f'"{version}-{encoding}"'
+    # Browsers must revalidate, which costs a 304 while nothing changed
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+
+def not_modified(version, encoding):
+    return Response(status_code=304, headers=list_headers(version, encoding))
+
+
+def list_response(table, if_none_match, accept_encoding):
+    """
+    Return the whole table, or a 304 if the client already has the current
+    version. When the table is not cached, the version is checked before
+    any rows are loaded. Compressed bodies are cached with the snapshot, so
+    each encoding is compressed once per version rather than per request.
+    """
+    encoding = choose_encoding(accept_encoding)
+
+    snapshot = snapshots.peek(table)
+    # Other workers' writes only reach the cache through the listener, so
+    # without it (or while it reconnects) a snapshot is checked against the
+    # current version before it is served
+    unverified = snapshot is not None and not listener.listening
+    if unverified or (snapshot is None and if_none_match is not None):
+        with borrow_db() as db:
+            cursor = db.cursor()
+            version = fetch_list_version(cursor, table)
+            cursor.close()
+        if etag_matches(if_none_match, version):
+            return not_modified(version, encoding)
+        if unverified and snapshot[0] != version:
+            snapshots.invalidate(table)
+            snapshot = None
+
+    if snapshot is None:
+        snapshot = snapshots.get(table, lambda: load_songs(table))
+    version, bodies = snapshot
+    if etag_matches(if_none_match, version):
+        return not_modified(version, encoding)
+
+    encoding, body = encoded_body(bodies, encoding)
+    headers = list_headers(version, encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# Routes
+# psycopg2 blocks, so routes that use the database are plain functions: FastAPI
+# runs them in its threadpool instead of on the event loop.
+@app.get("/songs/", response_model=Union[List[Song], SongPage])
+def get_songs(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: Literal["name", "created"] = "name",
+    response_format: Literal["json", "ndjson"] = Query("json", alias="format"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    if response_format == "ndjson":
+        if limit is not None or cursor is not None:
+            raise HTTPException(
+                status_code=400, detail="NDJSON export is not paginated"
+            )
+        return export_response("songs")
+
+    # Without limit or cursor the whole table is returned, as before
+    if limit is not None or cursor is not None:
+        with borrow_db() as db:
+            return fetch_song_page(
+                db, "songs", limit or DEFAULT_PAGE_SIZE, cursor, order
+            )
+
+    return list_response("songs", if_none_match, accept_encoding)
+
+
+@app.get("/todo/", response_model=Union[List[Song], SongPage])
+def get_todo_songs(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: Literal["name", "created"] = "name",
+    response_format: Literal["json", "ndjson"] = Query("json", alias="format"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    if response_format == "ndjson":
+        if limit is not None or cursor is not None:
+            raise HTTPException(
+                status_code=400, detail="NDJSON export is not paginated"
+            )
+        return export_response("todo_songs")
+
+    # Without limit or cursor the whole table is returned, as before
+    if limit is not None or cursor is not None:
+        with borrow_db() as db:
+            return fetch_song_page(
+                db, "todo_songs", limit or DEFAULT_PAGE_SIZE, cursor, order
+            )
+
+    return list_response("todo_songs", if_none_match, accept_encoding)
+
+
+@app.get("/songs/search", response_model=List[Song])
+def search_songs_route(
+    q: str = Query(..., min_length=1),
+    search_type: Literal["name", "singer", "tag"] = Query("name", alias="type"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    return search_songs(db, "songs", q, search_type, limit)
+
+
+@app.get("/todo/search", response_model=List[Song])
+def search_todo_songs_route(
+    q: str = Query(..., min_length=1),
+    search_type: Literal["name", "singer", "tag"] = Query("name", alias="type"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    return search_songs(db, "todo_songs", q, search_type, limit)
+
+
+@app.get("/songs/random", response_model=List[Song])
+def get_random_songs(
+    tag: Optional[str] = None,
+    singer: Optional[str] = None,
+    n: int = Query(1, ge=1, le=MAX_RANDOM_PICKS),
+    avoid_recent: bool = False,
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    return pick_random_songs(db, "songs", tag, singer, n, avoid_recent)
+
+
+@app.get("/todo/random", response_model=List[Song])
+def get_random_todo_songs(
+    tag: Optional[str] = None,
+    singer: Optional[str] = None,
+    n: int = Query(1, ge=1, le=MAX_RANDOM_PICKS),
+    avoid_recent: bool = False,
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    return pick_random_songs(db, "todo_songs", tag, singer, n, avoid_recent)
+
+
+@app.get("/songs/facets", response_model=Facets)
+def get_song_facets(db: psycopg2.extensions.connection = Depends(get_db)):
+    return fetch_facets(db, "songs")
+
+
+@app.get("/todo/facets", response_model=Facets)
+def get_todo_song_facets(db: psycopg2.extensions.connection = Depends(get_db)):
+    return fetch_facets(db, "todo_songs")
+
+
+@app.get("/songs/export")
+def export_songs():
+    return export_response("songs")
+
+
+@app.get("/todo/export")
+def export_todo_songs():
+    return export_response("todo_songs")
+
+
+def fetch_song(db, table, song_uuid, response, not_found_detail):
+    cursor = db.cursor()
+    cursor.execute(
+        f"SELECT data, version FROM {table} WHERE uuid = %s", (str(song_uuid),)
+    )
+    result = cursor.fetchone()
+    cursor.close()
+
+    if not result:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+
+    # Send the version back as If-Match to make an update conditional
+    response.headers["ETag"] = f'"{result["version"]}"'
+    return {**result["data"], "uuid": str(song_uuid)}
+
+
+@app.get("/songs/{song_uuid:uuid}", response_model=Song)
+def get_song(
+    song_uuid: uuid.UUID,
+    response: Response,
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    return fetch_song(db, "songs", song_uuid, response, "Song not found")
+
+
+@app.get("/todo/{song_uuid:uuid}", response_model=Song)
+def get_todo_song(
+    song_uuid: uuid.UUID,
+    response: Response,
+    db: psycopg2.extensions.connection = Depends(get_db),
+):
+    return fetch_song(db, "todo_songs", song_uuid, response, "Todo song not found")
+
+
 @app.post("/songs/new/", response_model=Song)
-async def create_song(
+def create_song(
     song: SongCreate,
+    response: Response,
     db: psycopg2.extensions.connection = Depends(get_db),
     _: dict = Depends(verify_token),
 ):
@@ -204,14 +1084,18 @@ async def create_song(
     cursor.execute(
         "INSERT INTO songs (uuid, data) VALUES (%s, %s)", (song_uuid, Json(song_data))
     )
+    notify(cursor, CHANGES_CHANNEL, "songs", "create", [song_uuid])
     cursor.close()
+    snapshots.invalidate("songs")
 
+    response.headers["ETag"] = '"1"'
     return {**song_data, "uuid": song_uuid}
 
 
 @app.post("/todo/new/", response_model=Song)
-async def create_todo_song(
+def create_todo_song(
     song: SongCreate,
+    response: Response,
     db: psycopg2.extensions.connection = Depends(get_db),
     _: dict = Depends(verify_token),
 ):
@@ -223,100 +1107,274 @@ async def create_todo_song(
         "INSERT INTO todo_songs (uuid, data) VALUES (%s, %s)",
         (song_uuid, Json(song_data)),
     )
+    notify(cursor, CHANGES_CHANNEL, "todo_songs", "create", [song_uuid])
     cursor.close()
+    snapshots.invalidate("todo_songs")
 
+    response.headers["ETag"] = '"1"'
     return {**song_data, "uuid": song_uuid}
 
 
-@app.post("/songs/update/", response_model=Song)
-async def update_song(
-    song_update: SongUpdate,
-    db: psycopg2.extensions.connection = Depends(get_db),
-    _: dict = Depends(verify_token),
-):
-    # First, get the existing song
-    cursor = db.cursor()
-    cursor.execute("SELECT data FROM songs WHERE uuid = %s", (song_update.uuid,))
-    result = cursor.fetchone()
+def insert_songs(db, table, songs):
+    """Insert SongCreate models in one transaction and return them with uuids."""
+    if not songs:
+        return []
+    rows = [(str(uuid.uuid4()), song.model_dump()) for song in songs]
 
-    if not result:
-        # Check if it's in todo_songs
-        cursor.execute(
-            "SELECT data FROM todo_songs WHERE uuid = %s", (song_update.uuid,)
+    with transaction(db):
+        cursor = db.cursor()
+        execute_values(
+            cursor,
+            f"INSERT INTO {table} (uuid, data) VALUES %s",
+            [(song_uuid, Json(song_data)) for song_uuid, song_data in rows],
         )
-        result = cursor.fetchone()
+        # Delivered on commit, together with the rows
+        notify(
+            cursor,
+            CHANGES_CHANNEL,
+            table,
+            "create",
+            [song_uuid for song_uuid, _ in rows],
+        )
+        cursor.close()
+    # After the commit, so a concurrent reload cannot cache the old rows
+    snapshots.invalidate(table)
 
-        if not result:
-            raise HTTPException(status_code=404, detail="Song not found")
+    return [{**song_data, "uuid": song_uuid} for song_uuid, song_data in rows]
 
-        table_name = "todo_songs"
-    else:
-        table_name = "songs"
 
-    # Update the song data
-    existing_data = result["data"]
+@app.post("/songs/new/batch", response_model=List[Song])
+def create_songs_batch(
+    songs: List[SongCreate] = Body(..., max_length=MAX_BATCH_SIZE),
+    db: psycopg2.extensions.connection = Depends(get_db),
+    _: dict = Depends(verify_token),
+):
+    return insert_songs(db, "songs", songs)
+
 
-    update_data = song_update.model_dump(exclude_unset=True)
-    song_uuid = update_data.pop("uuid")
+@app.post("/todo/new/batch", response_model=List[Song])
+def create_todo_songs_batch(
+    songs: List[SongCreate] = Body(..., max_length=MAX_BATCH_SIZE),
+    db: psycopg2.extensions.connection = Depends(get_db),
+    _: dict = Depends(verify_token),
+):
+    return insert_songs(db, "todo_songs", songs)
 
-    # Merge updates with existing data
-    for key, value in update_data.items():
-        if value is not None:  # Only update fields that were provided
-            existing_data[key] = value
 
-    # Save updated data
-    cursor.execute(
-        f"UPDATE {table_name} SET data = %s WHERE uuid = %s",
-        (Json(existing_data), song_uuid),
-    )
-    cursor.close()
+async def stream_import(request, db, table, import_format):
+    """
+    Feed the request body to a SongImporter line by line as it arrives, so
+    the upload is never held in memory. Parsing, validation and COPY run in
+    the threadpool.
+    """
+    from importer import SongImporter
 
-    return {**existing_data, "uuid": song_uuid}
+    importer = SongImporter(db, table, SongCreate, import_format)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
 
+    try:
+        try:
+            async for chunk in request.stream():
+                pending += decoder.decode(chunk)
+                lines = pending.split("\n")
+                pending = lines.pop()
+                if lines:
+                    await run_in_threadpool(importer.feed_lines, lines)
+            pending += decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Body must be UTF-8")
+
+        if pending:
+            await run_in_threadpool(importer.feed, pending)
+        return await run_in_threadpool(importer.finish)
+    finally:
+        # Chunks are committed as they go, so announce them even if a later
+        # one failed or the upload was cut short
+        if importer.imported:
+            snapshots.invalidate(table)
+            cursor = db.cursor()
+            await run_in_threadpool(
+                notify, cursor, CHANGES_CHANNEL, table, "import", None
+            )
+            cursor.close()
+
+
+@app.post("/songs/import")
+async def import_songs(
+    request: Request,
+    import_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: psycopg2.extensions.connection = Depends(get_db),
+    _: dict = Depends(verify_token),
+):
+    return await stream_import(request, db, "songs", import_format)
 
-@app.post("/todo/update/", response_model=Song)
-async def update_todo_song(
-    song_update: SongUpdate,
+
+@app.post("/todo/import")
+async def import_todo_songs(
+    request: Request,
+    import_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
     db: psycopg2.extensions.connection = Depends(get_db),
     _: dict = Depends(verify_token),
 ):
-    # Get the existing song from todo_songs
+    return await stream_import(request, db, "todo_songs", import_format)
+
+
+def parse_if_match(if_match):
+    """Return the version an If-Match header asks for, or None if absent."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+def split_update_statements(tables):
+    """
+    Return the update for update_song_data in the split schema, one UPDATE
+    per table, and the query that tells whether the song exists at all.
+    """
+    updates = []
+    for i, table in enumerate(tables):
+        condition = (
+            "uuid = %(uuid)s "
+            "AND (%(version)s::integer IS NULL OR version = %(version)s)"
+        )
+        # A later table is only updated if the song is not in an earlier one
+        for earlier in tables[:i]:
+            condition += (
+                f" AND NOT EXISTS (SELECT 1 FROM {earlier} WHERE uuid = %(uuid)s)"
+            )
+        updates.append(f"""
+            updated_{i} AS (
+                UPDATE {table}
+                SET data = data || %(patch)s::jsonb, version = version + 1
+                WHERE {condition}
+                RETURNING data, version, '{table}' AS table_name
+            )""")
+    selects = " UNION ALL ".join(
+        f"SELECT data, version, table_name FROM updated_{i}" for i in range(len(tables))
+    )
+    exists = " UNION ALL ".join(
+        f"SELECT 1 FROM {table} WHERE uuid = %(uuid)s" for table in tables
+    )
+    return f"WITH {','.join(updates)} {selects}", exists
+
+
+def unified_update_statements(tables):
+    """
+    The same for the unified schema, where a song is one row whichever list
+    it is on, so both are a single primary key lookup.
+    """
+    update = f"""
+        UPDATE {UNIFIED_TABLE}
+        SET data = data || %(patch)s::jsonb, version = version + 1
+        WHERE uuid = %(uuid)s AND status = ANY(%(tables)s)
+            AND (%(version)s::integer IS NULL OR version = %(version)s)
+        RETURNING data, version, status AS table_name
+    """
+    exists = (
+        f"SELECT 1 FROM {UNIFIED_TABLE} "
+        "WHERE uuid = %(uuid)s AND status = ANY(%(tables)s)"
+    )
+    return update, exists
+
+
+def update_song_data(db, tables, song_update, expected_version, not_found_detail):
+    """
+    Merge the provided fields into the song's JSONB document server-side and
+    bump its version, in one statement. The song is looked up in tables in
+    order. With expected_version set, the update only applies if the row is
+    still at that version; otherwise the caller gets a 409.
+    """
+    song_uuid = parse_uuids([song_update.uuid]).get(song_update.uuid)
+    if song_uuid is None:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+
+    update_data = song_update.model_dump(exclude_unset=True)
+    update_data.pop("uuid")
+    # Only update fields that were provided
+    patch = {key: value for key, value in update_data.items() if value is not None}
+    params = {
+        "uuid": song_uuid,
+        "patch": Json(patch),
+        "version": expected_version,
+        "tables": tables,
+    }
+    if SCHEMA == "unified":
+        update, exists = unified_update_statements(tables)
+    else:
+        update, exists = split_update_statements(tables)
+
     cursor = db.cursor()
-    cursor.execute("SELECT data FROM todo_songs WHERE uuid = %s", (song_update.uuid,))
+    cursor.execute(update, params)
     result = cursor.fetchone()
 
-    if not result:
-        raise HTTPException(status_code=404, detail="Todo song not found")
+    if not result and expected_version is not None:
+        # Tell a version conflict apart from a missing song
+        cursor.execute(exists, params)
+        if cursor.fetchone():
+            cursor.close()
+            raise HTTPException(
+                status_code=409, detail="Song was modified by someone else"
+            )
+    if result:
+        notify(cursor, CHANGES_CHANNEL, result["table_name"], "update", [song_uuid])
+        snapshots.invalidate(result["table_name"])
+    cursor.close()
 
-    # Update the song data
-    existing_data = result["data"]
+    if not result:
+        raise HTTPException(status_code=404, detail=not_found_detail)
 
-    update_data = song_update.model_dump(exclude_unset=True)
-    song_uuid = update_data.pop("uuid")
+    return {**result["data"], "uuid": song_uuid}, result["version"]
 
-    # Merge updates with existing data
-    for key, value in update_data.items():
-        if value is not None:  # Only update fields that were provided
-            existing_data[key] = value
 
-    # Save updated data
-    cursor.execute(
-        "UPDATE todo_songs SET data = %s WHERE uuid = %s",
-        (Json(existing_data), song_uuid),
+@app.post("/songs/update/", response_model=Song)
+def update_song(
+    song_update: SongUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: psycopg2.extensions.connection = Depends(get_db),
+    _: dict = Depends(verify_token),
+):
+    # The song may be in either list; songs takes precedence
+    song, version = update_song_data(
+        db,
+        ["songs", "todo_songs"],
+        song_update,
+        parse_if_match(if_match),
+        "Song not found",
     )
-    cursor.close()
+    response.headers["ETag"] = f'"{version}"'
+    return song
+
 
-    return {**existing_data, "uuid": song_uuid}
+@app.post("/todo/update/", response_model=Song)
+def update_todo_song(
+    song_update: SongUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: psycopg2.extensions.connection = Depends(get_db),
+    _: dict = Depends(verify_token),
+):
+    song, version = update_song_data(
+        db,
+        ["todo_songs"],
+        song_update,
+        parse_if_match(if_match),
+        "Todo song not found",
+    )
+    response.headers["ETag"] = f'"{version}"'
+    return song
 
 
 @app.post("/move/")
-async def move_songs(
+def move_songs(
     move_request: MoveSongs,
     db: psycopg2.extensions.connection = Depends(get_db),
     _: dict = Depends(verify_token),
 ):
-    not_found = []
-
     if move_request.moveto == "todo-songs":
         source_table = "songs"
         target_table = "todo_songs"
@@ -326,30 +1384,71 @@ async def move_songs(
     else:
         raise HTTPException(status_code=400, detail="Invalid moveto value")
 
-    cursor = db.cursor()
-
-    for song_uuid in move_request.uuids:
-        # Get the song from the source table
-        cursor.execute(f"SELECT data FROM {source_table} WHERE uuid = %s", (song_uuid,))
-        result = cursor.fetchone()
-
-        if not result:
-            not_found.append(song_uuid)
-            continue
+    parsed_uuids = parse_uuids(move_request.uuids)
 
-        song_data = result["data"]
-
-        # Insert the song into the target table
+    cursor = db.cursor()
+    if SCHEMA == "unified":
+        # The song stays where it is; only its status changes
         cursor.execute(
-            f"INSERT INTO {target_table} (uuid, data) VALUES (%s, %s) ON CONFLICT (uuid) DO UPDATE SET data = %s",
-            (song_uuid, Json(song_data), Json(song_data)),
+            f"""
+            UPDATE {UNIFIED_TABLE} SET status = %s
+            WHERE uuid = ANY(%s::uuid[]) AND status = %s
+            RETURNING uuid
+            """,
+            (target_table, list(parsed_uuids.values()), source_table),
         )
-
-        # Delete the song from the source table
-        cursor.execute(f"DELETE FROM {source_table} WHERE uuid = %s", (song_uuid,))
-
+        moved = {str(row["uuid"]) for row in cursor.fetchall()}
+    else:
+        with transaction(db):
+            # The source's triggers lock its version and facet rows until
+            # commit, then the target's do, so opposite moves would lock in
+            # opposite orders and deadlock. Taking both version rows in name
+            # order first makes them wait for each other instead.
+            cursor.execute(
+                """
+                SELECT 1 FROM song_list_versions
+                WHERE table_name IN (%s, %s)
+                ORDER BY table_name
+                FOR UPDATE
+                """,
+                (source_table, target_table),
+            )
+            # Delete from the source and insert the returned rows into the
+            # target in one statement
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {source_table}
+                    WHERE uuid = ANY(%s::uuid[])
+                    RETURNING uuid, data, created_at, version
+                )
+                INSERT INTO {target_table} (uuid, data, created_at, version)
+                SELECT uuid, data, created_at, version FROM moved
+                ON CONFLICT (uuid) DO UPDATE
+                    SET data = EXCLUDED.data, version = EXCLUDED.version
+                RETURNING uuid
+                """,
+                (list(parsed_uuids.values()),),
+            )
+            moved = {str(row["uuid"]) for row in cursor.fetchall()}
+    if moved:
+        notify(
+            cursor,
+            CHANGES_CHANNEL,
+            target_table,
+            "move",
+            sorted(moved),
+            source=source_table,
+        )
+        snapshots.invalidate(source_table, target_table)
     cursor.close()
 
+    not_found = [
+        song_uuid
+        for song_uuid in move_request.uuids
+        if parsed_uuids.get(song_uuid) not in moved
+    ]
+
     if not_found:
         return {"not_found": not_found}
     else:
@@ -361,23 +1460,50 @@ class DeleteRequest(BaseModel):
     uuids: List[str]
 
 
+def delete_rows(cursor, table, uuids, deleted):
+    """
+    Delete uuids from table in chunks of DELETE_CHUNK_SIZE, so no single
+    statement or result set grows with the request, adding the uuids that
+    were deleted to the set deleted as each chunk commits.
+    """
+    for start in range(0, len(uuids), DELETE_CHUNK_SIZE):
+        cursor.execute(
+            f"DELETE FROM {table} WHERE uuid = ANY(%s::uuid[]) RETURNING uuid",
+            (uuids[start : start + DELETE_CHUNK_SIZE],),
+        )
+        deleted.update(str(row["uuid"]) for row in cursor.fetchall())
+
+
+def delete_by_uuids(db, table, uuids):
+    """
+    Delete the given songs from table and return the requested uuids that
+    were not there.
+    """
+    parsed_uuids = parse_uuids(uuids)
+    deleted = set()
+
+    cursor = db.cursor()
+    try:
+        delete_rows(cursor, table, list(dict.fromkeys(parsed_uuids.values())), deleted)
+    finally:
+        # Chunks commit on their own, so announce them even if a later one failed
+        if deleted:
+            snapshots.invalidate(table)
+            notify(cursor, CHANGES_CHANNEL, table, "delete", sorted(deleted))
+        cursor.close()
+
+    return [
+        song_uuid for song_uuid in uuids if parsed_uuids.get(song_uuid) not in deleted
+    ]
+
+
 @app.post("/songs/delete/")
-async def delete_songs(
+def delete_songs(
     delete_request: DeleteRequest,
     db: psycopg2.extensions.connection = Depends(get_db),
     _: dict = Depends(verify_token),
 ):
-    cursor = db.cursor()
-    not_found = []
-
-    for song_uuid in delete_request.uuids:
-        cursor.execute("SELECT 1 FROM songs WHERE uuid = %s", (song_uuid,))
-        if not cursor.fetchone():
-            not_found.append(song_uuid)
-        else:
-            cursor.execute("DELETE FROM songs WHERE uuid = %s", (song_uuid,))
-
-    cursor.close()
+    not_found = delete_by_uuids(db, "songs", delete_request.uuids)
 
     if not_found:
         return {"not_found": not_found}
@@ -385,22 +1511,12 @@ async def delete_songs(
 
 
 @app.post("/todo/delete/")
-async def delete_todo_songs(
+def delete_todo_songs(
     delete_request: DeleteRequest,
     db: psycopg2.extensions.connection = Depends(get_db),
     _: dict = Depends(verify_token),
 ):
-    cursor = db.cursor()
-    not_found = []
-
-    for song_uuid in delete_request.uuids:
-        cursor.execute("SELECT 1 FROM todo_songs WHERE uuid = %s", (song_uuid,))
-        if not cursor.fetchone():
-            not_found.append(song_uuid)
-        else:
-            cursor.execute("DELETE FROM todo_songs WHERE uuid = %s", (song_uuid,))
-
-    cursor.close()
+    not_found = delete_by_uuids(db, "todo_songs", delete_request.uuids)
 
     if not_found:
         return {"not_found": not_found}
@@ -0,0 +1,74 @@
+import os
+import gzip
+import time
+import argparse
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+from compression import brotli
+from bench_serialize import fill_table, encode_json_agg
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection string
+db_connection_string = os.getenv("DATABASE_URL")
+
+
+def compressors():
+    yield "identity", "-", lambda body: body
+    for level in (1, 6, 9):
+        yield "gzip", level, lambda body, level=level: gzip.compress(body, level)
+    if brotli is not None:
+        for quality in (4, 6, 9):
+            yield "br", quality, lambda body, quality=quality: brotli.compress(
+                body, quality=quality
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure bytes on the wire and compression CPU for the full "
+        "song list, built from a temporary table in DATABASE_URL."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--requests-per-version",
+        type=int,
+        default=100,
+        help="list requests served between two writes, to amortize over",
+    )
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(db_connection_string, cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    if brotli is None:
+        print("brotli is not installed, only gzip is measured")
+
+    print(
+        f"{'songs':>7} {'encoding':>8} {'level':>5} {'bytes':>11} {'ratio':>6} "
+        f"{'compress ms':>12} {'ms/request':>11}"
+    )
+    for size in args.sizes:
+        fill_table(cursor, size)
+        body = encode_json_agg(cursor)
+        for encoding, level, compress in compressors():
+            start = time.perf_counter()
+            compressed = compress(body)
+            elapsed = (time.perf_counter() - start) * 1000
+            # Once per version when cached, once per request when not
+            print(
+                f"{size:>7} {encoding:>8} {level:>5} {len(compressed):>11} "
+                f"{len(body) / len(compressed):>5.1f}x {elapsed:>12.1f} "
+                f"{elapsed / args.requests_per_version:>11.3f}"
+            )
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection string
+db_connection_string = os.getenv("DATABASE_URL")
+
+
+def run(url, path, concurrency, total):
+    """
+    Send `total` GET requests to `path` from `concurrency` threads, each with
+    its own keep-alive connection, and return throughput and latencies.
+    """
+    parts = urlsplit(url)
+    latencies = []
+    errors = 0
+    remaining = [total]
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal errors
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall,
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+        "max": max(latencies) * 1000,
+    }
+
+
+def stall(url, path, slow_path, table, seconds, concurrency, total):
+    """
+    Hold an ACCESS EXCLUSIVE lock on table for `seconds`, so a request to
+    slow_path waits that long on the database, and meanwhile send `total`
+    requests to path. Routes that block the event loop would hold the fast
+    requests up until the lock is released.
+    """
+    parts = urlsplit(url)
+    conn = psycopg2.connect(db_connection_string)
+    cursor = conn.cursor()
+    cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    # Released on a timer, since a stalled server would not answer until then
+    release = threading.Timer(seconds, conn.rollback)
+    release.start()
+
+    slow = {}
+
+    def slow_request():
+        slow_conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+        start = time.perf_counter()
+        slow_conn.request("GET", slow_path)
+        response = slow_conn.getresponse()
+        response.read()
+        slow["status"] = response.status
+        slow["latency"] = (time.perf_counter() - start) * 1000
+        slow_conn.close()
+
+    slow_thread = threading.Thread(target=slow_request)
+    slow_thread.start()
+    # Give the slow request time to reach the lock
+    time.sleep(min(0.2, seconds / 10))
+    result = run(url, path, concurrency, total)
+
+    slow_thread.join()
+    release.join()
+    conn.close()
+    result["slow_status"] = slow["status"]
+    result["slow_latency"] = slow["latency"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure request throughput of a running Song Manager API "
+        "at increasing concurrency. Run it once against the old build and once "
+        "against the new one, both pointed at the same local Postgres."
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/songs/")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--stall-seconds",
+        type=float,
+        default=2.0,
+        help="then hold a lock on --stall-table this long, so one request to "
+        "--slow-path waits on the database, while timing requests to --path; "
+        "0 skips this (needs DATABASE_URL)",
+    )
+    parser.add_argument("--stall-table", default="todo_songs")
+    parser.add_argument("--slow-path", default="/todo/?limit=10")
+    args = parser.parse_args()
+
+    print(f"GET {args.url}{args.path}")
+    print(
+        f"{'conc':>5} {'reqs':>6} {'errors':>6} {'req/s':>9} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for concurrency in args.concurrency:
+        result = run(args.url, args.path, concurrency, args.requests)
+        print(
+            f"{result['concurrency']:>5} {result['requests']:>6} "
+            f"{result['errors']:>6} {result['throughput']:>9.1f} "
+            f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}"
+        )
+
+    if args.stall_seconds > 0:
+        result = stall(
+            args.url,
+            args.path,
+            args.slow_path,
+            args.stall_table,
+            args.stall_seconds,
+            args.concurrency[0],
+            args.requests,
+        )
+        print(
+            f"\nGET {args.slow_path} waited {result['slow_latency']:.0f} ms "
+            f"on a lock on {args.stall_table} (status {result['slow_status']}); "
+            f"meanwhile GET {args.path}:"
+        )
+        print(
+            f"{result['requests']:>6} requests, {result['errors']} errors, "
+            f"{result['throughput']:.1f} req/s, p50 {result['p50']:.1f} ms, "
+            f"p99 {result['p99']:.1f} ms, max {result['max']:.1f} ms"
+        )
+        if result["slow_latency"] < args.stall_seconds * 1000 / 2:
+            print(
+                f"warning: {args.slow_path} did not wait for the lock; "
+                f"use a path that queries {args.stall_table}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import uuid
+import time
+import argparse
+import psycopg2
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from dotenv import load_dotenv
+
+from app import delete_rows
+from mockdata import generate_song
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection string
+db_connection_string = os.getenv("DATABASE_URL")
+
+TABLE = "pg_temp.bench_songs"
+
+
+def fill_table(cursor, count):
+    """Create a scratch copy of the songs table holding `count` rows."""
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute("CREATE TEMP TABLE bench_songs (LIKE songs INCLUDING ALL)")
+    uuids = [str(uuid.uuid4()) for _ in range(count)]
+    execute_values(
+        cursor,
+        f"INSERT INTO {TABLE} (uuid, data) VALUES %s",
+        [(song_uuid, Json(generate_song())) for song_uuid in uuids],
+        page_size=1000,
+    )
+    cursor.execute(f"ANALYZE {TABLE}")
+    return uuids
+
+
+def delete_per_row(conn, uuids):
+    """The original implementation: probe, then delete, one uuid at a time."""
+    cursor = conn.cursor()
+    not_found = []
+    for song_uuid in uuids:
+        cursor.execute(f"SELECT 1 FROM {TABLE} WHERE uuid = %s", (song_uuid,))
+        if not cursor.fetchone():
+            not_found.append(song_uuid)
+        else:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE uuid = %s", (song_uuid,))
+    cursor.close()
+    return not_found
+
+
+def delete_batched(conn, uuids):
+    """
+    The chunked DELETE of delete_by_uuids, without its change notification,
+    which would go out to every listener of the live database.
+    """
+    cursor = conn.cursor()
+    deleted = set()
+    delete_rows(cursor, TABLE, list(dict.fromkeys(uuids)), deleted)
+    cursor.close()
+    return [song_uuid for song_uuid in uuids if song_uuid not in deleted]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare per-row and batched deletes against the database "
+        "in DATABASE_URL. Rows live in a temporary table, so real data is "
+        "never touched."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument(
+        "--missing",
+        type=float,
+        default=0.1,
+        help="fraction of requested uuids that do not exist",
+    )
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(db_connection_string, cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    print(f"{'batch':>7} {'per-row ms':>11} {'batched ms':>11} {'speedup':>8}")
+    for size in args.sizes:
+        timings = {}
+        for name, delete in (("per-row", delete_per_row), ("batched", delete_batched)):
+            existing = fill_table(cursor, size)
+            missing = [str(uuid.uuid4()) for _ in range(int(size * args.missing))]
+            requested = existing[: size - len(missing)] + missing
+
+            start = time.perf_counter()
+            not_found = delete(conn, requested)
+            timings[name] = (time.perf_counter() - start) * 1000
+            assert len(not_found) == len(missing)
+
+        print(
+            f"{size:>7} {timings['per-row']:>11.1f} {timings['batched']:>11.1f} "
+            f"{timings['per-row'] / timings['batched']:>7.1f}x"
+        )
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import statistics
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from dotenv import load_dotenv
+
+from mockdata import generate_song, sample_singers, sample_song_names, sample_tags
+
+# Load environment variables
+load_dotenv()
+
+ADMIN_USERNAME = os.getenv("SONGLIST_USERNAME")
+ADMIN_PASSWORD = os.getenv("SONGLIST_PASSWORD")
+
+DEFAULT_MIX = "list=40,page=10,search=20,create=10,update=10,move=5,delete=5"
+
+
+class Client:
+    """One keep-alive connection to the API, used by a single thread."""
+
+    def __init__(self, host, port, token=None):
+        self.host = host
+        self.port = port
+        self.headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        if token is not None:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+
+    def request(self, method, path, body=None):
+        """Return (status, parsed JSON body or None)."""
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, payload, self.headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            return 0, None
+        if response.getheader("Content-Encoding") is None and data[:1] in (b"{", b"["):
+            return response.status, json.loads(data)
+        return response.status, None
+
+    def close(self):
+        self.conn.close()
+
+
+class Workload:
+    """
+    The operations a simulated user performs. Writes only touch songs this
+    thread created, so threads never race each other for the same row.
+    """
+
+    def __init__(self, client, rng):
+        self.client = client
+        self.rng = rng
+        self.owned = []
+
+    def list(self):
+        path = "/songs/" if self.rng.random() < 0.8 else "/todo/"
+        return "list", self.client.request("GET", path)[0]
+
+    def page(self):
+        order = self.rng.choice(["name", "created"])
+        return "page", self.client.request("GET", f"/songs/?limit=100&order={order}")[0]
+
+    def search(self):
+        search_type, values = self.rng.choice(
+            [
+                ("name", sample_song_names),
+                ("singer", sample_singers),
+                ("tag", sample_tags),
+            ]
+        )
+        q = self.rng.choice(values)
+        if search_type == "name":
+            q = q[:4]
+        query = urlencode({"q": q, "type": search_type})
+        return "search", self.client.request("GET", f"/songs/search?{query}")[0]
+
+    def create(self):
+        status, song = self.client.request(
+            "POST", "/songs/new/", generate_song(self.rng)
+        )
+        if status == 200:
+            self.owned.append(song["uuid"])
+        return "create", status
+
+    def update(self):
+        if not self.owned:
+            return self.create()
+        body = {"uuid": self.rng.choice(self.owned), **generate_song(self.rng)}
+        del body["name"]
+        return "update", self.client.request("POST", "/songs/update/", body)[0]
+
+    def move(self):
+        if not self.owned:
+            return self.create()
+        song_uuid = self.rng.choice(self.owned)
+        status, _ = self.client.request(
+            "POST", "/move/", {"moveto": "todo-songs", "uuids": [song_uuid]}
+        )
+        if status == 200:
+            # Move it straight back, so later writes still find it in songs
+            status, _ = self.client.request(
+                "POST", "/move/", {"moveto": "songs-todo", "uuids": [song_uuid]}
+            )
+        return "move", status
+
+    def delete(self):
+        if not self.owned:
+            return self.create()
+        song_uuid = self.owned.pop(self.rng.randrange(len(self.owned)))
+        status, _ = self.client.request(
+            "POST", "/songs/delete/", {"uuids": [song_uuid]}
+        )
+        return "delete", status
+
+
+def parse_mix(mix):
+    """Turn "list=40,search=20" into ([ops], [weights])."""
+    ops, weights = [], []
+    for part in mix.split(","):
+        op, _, weight = part.partition("=")
+        if not hasattr(Workload, op.strip()):
+            raise SystemExit(f"Unknown operation in mix: {op}")
+        ops.append(op.strip())
+        weights.append(float(weight or 1))
+    return ops, weights
+
+
+def summarize(latencies, errors, wall):
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100)
+    else:
+        quantiles = [latencies[0] if latencies else 0.0] * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall,
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+    }
+
+
+def drive(host, port, token, mix, concurrency, duration, seed):
+    """
+    Run the mix from `concurrency` threads for `duration` seconds and return
+    per-operation and overall results. Thread i draws its operations from
+    Random(seed + i), so a run is repeatable for a given configuration.
+    """
+    ops, weights = parse_mix(mix)
+    latencies = {op: [] for op in ops}
+    errors = {op: 0 for op in ops}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client(host, port, token)
+        workload = Workload(client, rng)
+        while time.perf_counter() < deadline:
+            op = rng.choices(ops, weights)[0]
+            start = time.perf_counter()
+            name, status = getattr(workload, op)()
+            elapsed = time.perf_counter() - start
+            with lock:
+                # A write with nothing to work on yet falls back to a create
+                latencies.setdefault(name, []).append(elapsed)
+                errors.setdefault(name, 0)
+                if status != 200:
+                    errors[name] += 1
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    results = {
+        name: summarize(values, errors[name], wall)
+        for name, values in latencies.items()
+        if values
+    }
+    results["total"] = summarize(
+        [value for values in latencies.values() for value in values],
+        sum(errors.values()),
+        wall,
+    )
+    return results
+
+
+def seed_database(songs, todo_songs, seed):
+    subprocess.run(
+        [
+            sys.executable,
+            "mockdata.py",
+            "--songs",
+            str(songs),
+            "--todo-songs",
+            str(todo_songs),
+            "--seed",
+            str(seed),
+            "--truncate",
+        ],
+        check=True,
+    )
+
+
+def start_server(port, workers):
+    """Start uvicorn on port and wait until it answers."""
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ]
+    )
+    for _ in range(100):
+        if server.poll() is not None:
+            raise SystemExit("The server exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/changes")
+            conn.getresponse().read()
+            conn.close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("The server did not come up")
+
+
+def login(port):
+    client = Client("127.0.0.1", port)
+    status, body = client.request(
+        "POST", "/login", {"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD}
+    )
+    client.close()
+    if status != 200:
+        raise SystemExit("Login failed; set SONGLIST_USERNAME and SONGLIST_PASSWORD")
+    return body["access_token"]
+
+
+def git_commit():
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return result.stdout.strip() or None
+
+
+def print_results(results):
+    print(
+        f"{'operation':<10} {'reqs':>7} {'errors':>6} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<10} {result['requests']:>7} {result['errors']:>6} "
+            f"{result['throughput']:>8.1f} {result['p50']:>8.1f} "
+            f"{result['p95']:>8.1f} {result['p99']:>8.1f}"
+        )
+
+
+def run(args):
+    if not args.no_seed:
+        seed_database(args.songs, args.todo_songs, args.seed)
+
+    server = start_server(args.port, args.workers)
+    try:
+        token = login(args.port)
+        if args.warmup:
+            drive(
+                "127.0.0.1",
+                args.port,
+                token,
+                args.mix,
+                args.concurrency,
+                args.warmup,
+                args.seed,
+            )
+        results = drive(
+            "127.0.0.1",
+            args.port,
+            token,
+            args.mix,
+            args.concurrency,
+            args.duration,
+            args.seed,
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_results(results)
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("command", "handler", "output")
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    if old["config"] != new["config"]:
+        print("warning: the runs used different configurations")
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    print(f"{'operation':<10} {'metric':<10} {'old':>9} {'new':>9} {'change':>8}")
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        for metric in ("throughput", "p50", "p95", "p99"):
+            before = old["results"][name][metric]
+            after = result[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            print(
+                f"{name:<10} {metric:<10} {before:>9.1f} {after:>9.1f} "
+                f"{change:>+7.1f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end load test: seed the database in DATABASE_URL, "
+        "start the API with uvicorn and drive a mixed workload against it."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run",
+        help="run a benchmark; seeding truncates both tables, so point "
+        "DATABASE_URL at a scratch database",
+    )
+    run_parser.add_argument("--songs", type=int, default=10000)
+    run_parser.add_argument("--todo-songs", type=int, default=1000)
+    run_parser.add_argument(
+        "--no-seed", action="store_true", help="keep the current data"
+    )
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--mix", default=DEFAULT_MIX)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float, default=30, help="seconds")
+    run_parser.add_argument("--warmup", type=float, default=5, help="seconds")
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    run_parser.add_argument("--port", type=int, default=8765)
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
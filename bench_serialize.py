@@ -0,0 +1,119 @@
+import os
+import json
+import uuid
+import time
+import argparse
+from typing import List
+import psycopg2
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from pydantic import TypeAdapter
+from dotenv import load_dotenv
+
+from app import Song
+from mockdata import generate_song
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection string
+db_connection_string = os.getenv("DATABASE_URL")
+
+TABLE = "pg_temp.bench_songs"
+
+song_list = TypeAdapter(List[Song])
+
+
+def fill_table(cursor, count):
+    """Create a scratch copy of the songs table holding `count` rows."""
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute("CREATE TEMP TABLE bench_songs (LIKE songs INCLUDING ALL)")
+    execute_values(
+        cursor,
+        f"INSERT INTO {TABLE} (uuid, data) VALUES %s",
+        [(str(uuid.uuid4()), Json(generate_song())) for _ in range(count)],
+        page_size=1000,
+    )
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def encode_models(cursor):
+    """
+    The original path: build a Song per row, then do what FastAPI does with
+    response_model=List[Song], validate the list again and encode it.
+    """
+    cursor.execute(f"SELECT uuid, data FROM {TABLE}")
+    songs = []
+    for row in cursor.fetchall():
+        song_data = row["data"]
+        song_data["uuid"] = str(row["uuid"])
+        songs.append(Song(**song_data))
+
+    validated = song_list.validate_python(songs, from_attributes=True)
+    return json.dumps(song_list.dump_python(validated, mode="json")).encode()
+
+
+def encode_rows(cursor):
+    """Skip the models but still parse every row in Python."""
+    cursor.execute(f"SELECT uuid, data FROM {TABLE}")
+    songs = [{**row["data"], "uuid": str(row["uuid"])} for row in cursor.fetchall()]
+    return json.dumps(songs).encode()
+
+
+def encode_json_agg(cursor):
+    """The path load_songs takes: Postgres returns the finished array."""
+    cursor.execute(f"""
+        SELECT coalesce(
+            json_agg(data || jsonb_build_object('uuid', uuid)), '[]'
+        )::text AS body
+        FROM {TABLE}
+    """)
+    return cursor.fetchone()["body"].encode()
+
+
+ENCODERS = {
+    "models": encode_models,
+    "rows": encode_rows,
+    "json_agg": encode_json_agg,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the per-song cost of building the full list "
+        "response from the database in DATABASE_URL. Rows live in a temporary "
+        "table, so real data is never touched."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(db_connection_string, cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    header = " ".join(f"{name + ' us/song':>16}" for name in ENCODERS)
+    print(f"{'songs':>7} {header} {'speedup':>8} {'bytes':>11}")
+    for size in args.sizes:
+        fill_table(cursor, size)
+        timings = {}
+        for name, encode in ENCODERS.items():
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                body = encode(cursor)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best / size * 1e6
+            assert len(json.loads(body)) == size
+
+        columns = " ".join(f"{timings[name]:>16.2f}" for name in ENCODERS)
+        print(
+            f"{size:>7} {columns} "
+            f"{timings['models'] / timings['json_agg']:>7.1f}x {len(body):>11}"
+        )
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+from bench_load import git_commit
+
+PHASES = ("import", "first_byte", "cold_total", "warm_first_byte")
+
+
+async def call(asgi_app, path):
+    """Send one GET straight to the ASGI app; return (status, seconds to body)."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    status = None
+    first_byte = None
+    start = time.perf_counter()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, first_byte
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and first_byte is None:
+            first_byte = time.perf_counter() - start
+
+    await asgi_app(scope, receive, send)
+    return status, first_byte
+
+
+def child(path, spawned_at):
+    """
+    Run in a fresh interpreter: import the app the way a serverless instance
+    does, without the lifespan hook, then time two requests to path.
+    """
+    start = time.perf_counter()
+    import app
+
+    imported = time.perf_counter() - start
+
+    async def requests():
+        return await call(app.app, path), await call(app.app, path)
+
+    (status, first_byte), (_, warm_first_byte) = asyncio.run(requests())
+    cold_total = time.time() - spawned_at
+    app.pool.close()
+    json.dump(
+        {
+            "status": status,
+            "import": imported * 1000,
+            "first_byte": first_byte * 1000,
+            "cold_total": cold_total * 1000,
+            "warm_first_byte": warm_first_byte * 1000,
+        },
+        sys.stdout,
+    )
+
+
+def spawn(path, env):
+    spawned_at = time.time()
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", path, str(spawned_at)],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit("The app failed to start")
+    return json.loads(result.stdout)
+
+
+def slowest_imports(env, count):
+    """The modules with the largest self time while importing app."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append((int(self_us), int(cumulative_us), name.strip()))
+    modules.sort(reverse=True)
+    return modules[:count]
+
+
+def summarize(samples):
+    return {
+        phase: {
+            "median": statistics.median(sample[phase] for sample in samples),
+            "max": max(sample[phase] for sample in samples),
+        }
+        for phase in PHASES
+    }
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], float(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Measure the cold start of the API in fresh interpreters, "
+        "as on a serverless deployment: time to import app, and time to the "
+        "first byte of a request against DATABASE_URL."
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/songs/")
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        help="open the pool's connections during import (SONGLIST_POOL_PREWARM)",
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="exit with status 1 if the median cold_total exceeds this",
+    )
+    parser.add_argument(
+        "--top-imports", type=int, default=10, help="list the slowest modules"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, SONGLIST_POOL_PREWARM="1" if args.prewarm else "0")
+    samples = [spawn(args.path, env) for _ in range(args.runs)]
+    statuses = {sample["status"] for sample in samples}
+    if statuses != {200}:
+        print(f"warning: {args.path} answered with {sorted(statuses)}")
+
+    results = summarize(samples)
+    print(f"{'phase':<16} {'median ms':>10} {'max ms':>10}")
+    for phase, result in results.items():
+        print(f"{phase:<16} {result['median']:>10.1f} {result['max']:>10.1f}")
+
+    if args.top_imports:
+        print(f"\n{'self ms':>8} {'total ms':>9}  module")
+        for self_us, cumulative_us, name in slowest_imports(env, args.top_imports):
+            print(f"{self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}  {name}")
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {
+                key: value for key, value in vars(args).items() if key != "output"
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.budget_ms is not None and results["cold_total"]["median"] > args.budget_ms:
+        raise SystemExit(
+            f"Cold start of {results['cold_total']['median']:.1f} ms is over "
+            f"the {args.budget_ms:.1f} ms budget"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import psycopg2
+from dotenv import load_dotenv
+
+from app import SEARCH_CONDITIONS
+from table import LISTS, STORAGE_TABLES
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection string
+db_connection_string = os.getenv("DATABASE_URL")
+
+# Selective searches must go through the index table.py builds for them
+INDEX_SUFFIXES = {
+    "name": "_name_trgm_idx",
+    "singer": "_singers_idx",
+    "tag": "_tags_idx",
+}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def sample_params(cur, table):
+    """
+    Pick a name fragment, a singer and a tag that exist in the table, plus
+    values that match nothing. Common values may legitimately be served by a
+    sequential scan that stops at the LIMIT; selective ones must use an index.
+    """
+    cur.execute(f"""
+        SELECT data->>'name', data->'singers'->>0, data->'tags'->>0
+        FROM {table}
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row is None:
+        return None
+
+    name, singer, tag = row
+    return {
+        "common": {
+            "name": f"%{name[:4]}%",
+            "singer": json.dumps([singer]),
+            "tag": json.dumps([tag]),
+        },
+        "selective": {
+            "name": "%qxzqxz%",
+            "singer": json.dumps(["qxzqxz"]),
+            "tag": json.dumps(["qxzqxz"]),
+        },
+    }
+
+
+def check_plans():
+    """
+    EXPLAIN every search mode on both tables. A selective search fails
+    unless its plan uses the search index for its mode.
+    Seed a realistically sized table first (e.g. 1M rows with mockdata.py),
+    since the planner rightly prefers a sequential scan on tiny tables.
+    """
+    conn = psycopg2.connect(db_connection_string)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    for table in STORAGE_TABLES:
+        cur.execute(f"ANALYZE {table}")
+
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if cur.fetchone() is None:
+        print("pg_trgm is not installed, so name search has no index to use")
+
+    failures = 0
+    for table in LISTS:
+        params = sample_params(cur, table)
+        if params is None:
+            print(f"{table}: empty, skipped")
+            continue
+
+        for kind, values in params.items():
+            for search_type, condition in SEARCH_CONDITIONS.items():
+                cur.execute(
+                    f"EXPLAIN (ANALYZE, FORMAT JSON) "
+                    f"SELECT uuid, data FROM {table} WHERE {condition} LIMIT 100",
+                    (values[search_type],),
+                )
+                plan = cur.fetchone()[0][0]
+                nodes = list(plan_nodes(plan["Plan"]))
+                indexes = [node["Index Name"] for node in nodes if "Index Name" in node]
+                uses_index = any(
+                    index.endswith(INDEX_SUFFIXES[search_type]) for index in indexes
+                )
+                failed = kind == "selective" and not uses_index
+                failures += failed
+
+                print(
+                    f"{table:<10} {search_type:<6} {kind:<9} "
+                    f"{'FAIL' if failed else 'ok':<4} "
+                    f"{plan['Execution Time']:>9.2f} ms  "
+                    f"{' > '.join(node['Node Type'] for node in nodes)}"
+                    f"{'  (' + ', '.join(indexes) + ')' if indexes else ''}"
+                )
+
+    cur.close()
+    conn.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check_plans() else 0)
@@ -0,0 +1,72 @@
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+
+# Smaller bodies are sent as they are
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, GZIP_LEVEL)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+
+# Most preferred first
+PREFERRED_ENCODINGS = ("br", "gzip")
+
+# Held while compressing, so concurrent requests for a new version wait for
+# one compression instead of each running their own
+compress_lock = threading.Lock()
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """Return the best encoding the client accepts, or "identity"."""
+    accepted = parse_accept_encoding(header)
+    for coding in PREFERRED_ENCODINGS:
+        if coding in COMPRESSORS and accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return "identity"
+
+
+def encoded_body(bodies, encoding):
+    """
+    Return the body in the given encoding from bodies, a dict that starts out
+    holding only "identity" and collects each encoding the first time it is
+    asked for. Keep bodies next to the data it was made from, so every
+    encoding is compressed once per version.
+    """
+    identity = bodies["identity"]
+    if encoding == "identity" or len(identity) < MIN_COMPRESS_SIZE:
+        return "identity", identity
+
+    body = bodies.get(encoding)
+    if body is None:
+        with compress_lock:
+            body = bodies.get(encoding)
+            if body is None:
+                body = bodies[encoding] = COMPRESSORS[encoding](identity)
+    return encoding, body
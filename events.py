@@ -0,0 +1,149 @@
+import json
+import select
+import asyncio
+import logging
+import threading
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Largest NOTIFY payload Postgres accepts is just under 8000 bytes
+MAX_NOTIFY_UUIDS = 100
+
+
+def notify(cursor, channel, table, op, uuids, **extra):
+    """
+    Announce a write on channel. Large batches are sent without their uuids;
+    listeners then know something changed and resync through /changes.
+    """
+    payload = {"table": table, "op": op, **extra}
+    if uuids is not None and len(uuids) <= MAX_NOTIFY_UUIDS:
+        payload["uuids"] = list(uuids)
+    else:
+        payload["uuids"] = None
+    cursor.execute("SELECT pg_notify(%s, %s)", (channel, json.dumps(payload)))
+
+
+class ChangeListener:
+    """
+    Hold one LISTEN connection per worker and fan its notifications out to
+    any number of asyncio queues (one per connected client) and to plain
+    callbacks. The connection lives in a background thread and reconnects
+    on failure.
+    """
+
+    def __init__(self, connect, channel, queue_size=100, poll_timeout=5.0):
+        self.connect = connect
+        self.channel = channel
+        self.queue_size = queue_size
+        self.poll_timeout = poll_timeout
+
+        self._lock = threading.Lock()
+        self._queues = set()
+        self._callbacks = []
+        self._loop = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.delivered = 0
+        self.reconnects = 0
+        # True while LISTEN is active, so no notification can be missed
+        self.listening = False
+
+    def start(self, loop=None):
+        with self._lock:
+            if loop is not None:
+                self._loop = loop
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="change-listener", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            thread.join(self.poll_timeout + 1)
+
+    def add_callback(self, callback):
+        """Call callback(payload) from the listener thread on every event."""
+        self._callbacks.append(callback)
+
+    def subscribe(self):
+        """Return a queue of payloads; must be called on the event loop."""
+        queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._queues.add(queue)
+            self._loop = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._queues.discard(queue)
+
+    @property
+    def subscribers(self):
+        return len(self._queues)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {self.channel}")
+                cursor.close()
+                backoff = 1.0
+                self.listening = True
+                if self.reconnects:
+                    # Anything sent while we were away is lost: resync everyone
+                    self._dispatch(json.dumps({"op": "reset"}))
+
+                while not self._stop.is_set():
+                    ready, _, _ = select.select([conn], [], [], self.poll_timeout)
+                    if not ready:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError):
+                self.reconnects += 1
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                self.listening = False
+                if conn is not None:
+                    conn.close()
+
+    def _dispatch(self, payload):
+        for callback in self._callbacks:
+            # A failing callback must not take the listener thread down with it
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Change callback failed on %r", payload)
+
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            # One wakeup of the event loop per event, however many clients
+            loop.call_soon_threadsafe(self._broadcast, payload)
+
+    def _broadcast(self, payload):
+        with self._lock:
+            queues = list(self._queues)
+        for queue in queues:
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # The client fell behind: replace its backlog with a resync hint
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(json.dumps({"op": "reset"}))
+        self.delivered += len(queues)
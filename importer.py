@@ -0,0 +1,242 @@
+import io
+import os
+import csv
+import sys
+import json
+import uuid
+import argparse
+import psycopg2
+from collections import deque
+from pydantic import ValidationError
+from dotenv import load_dotenv
+from table import copy_target
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection string
+db_connection_string = os.getenv("DATABASE_URL")
+
+# CSV files need a header naming these columns; list columns are separated by ";"
+CSV_COLUMNS = ("name", "singers", "tags", "links")
+CSV_LIST_COLUMNS = ("singers", "tags", "links")
+CSV_LIST_SEPARATOR = ";"
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+def contains_nul(value):
+    if isinstance(value, str):
+        return "\x00" in value
+    if isinstance(value, dict):
+        return any(contains_nul(k) or contains_nul(v) for k, v in value.items())
+    if isinstance(value, list):
+        return any(contains_nul(item) for item in value)
+    return False
+
+
+class LineQueue:
+    """Lines waiting for the CSV reader. Iteration stops when it runs dry and
+    picks up again once more lines are queued."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+class SongImporter:
+    """
+    Validate song records as lines are fed in and load them into a table with
+    COPY, chunk_size rows at a time. Input is NDJSON (one JSON object per
+    line) or CSV with a header row, where a quoted field may span lines. A
+    bad record is reported with its first line number and skipped; it never
+    aborts the load.
+    """
+
+    def __init__(self, conn, table, model, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+        if fmt not in ("ndjson", "csv"):
+            raise ValueError(f"Unsupported format: {fmt}")
+
+        self.conn = conn
+        self.table = table
+        self.model = model
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+
+        self.line_no = 0
+        self.record_line = 0
+        self.header = None
+        # One reader over every line fed, so records can span lines
+        self.csv_lines = LineQueue()
+        self.csv_reader = csv.reader(self.csv_lines)
+        self.open_quote = False
+        self.rows = []
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def feed_lines(self, lines):
+        for line in lines:
+            self.feed(line)
+
+    def feed(self, line):
+        self.line_no += 1
+        line = line.rstrip("\r\n")
+        if self.fmt == "csv":
+            self.feed_csv(line)
+        elif line.strip():
+            self.record_line = self.line_no
+            self.add(line)
+
+    def feed_csv(self, line):
+        self.csv_lines.lines.append(line + "\n")
+        # Quoted fields hold an even number of quotes, so an odd count so far
+        # means a field is still open and the record goes on in the next line
+        self.open_quote ^= line.count('"') % 2 == 1
+        while not self.open_quote and self.csv_lines.lines:
+            self.record_line = self.csv_reader.line_num + 1
+            try:
+                values = next(self.csv_reader)
+            except csv.Error as e:
+                self.error(str(e))
+                continue
+            if len(values) > 1 or values and values[0].strip():
+                self.add(values)
+
+    def add(self, raw):
+        try:
+            record = self.parse(raw)
+            if record is None:
+                return
+            song = self.model(**record)
+        except ValidationError as e:
+            self.error("; ".join(error["msg"] for error in e.errors()))
+            return
+        except (ValueError, TypeError) as e:
+            self.error(str(e))
+            return
+
+        data = song.model_dump()
+        # jsonb rejects NUL, which would fail the COPY of the whole chunk
+        if contains_nul(data):
+            self.error("Text must not contain NUL characters")
+            return
+        self.rows.append((str(uuid.uuid4()), json.dumps(data)))
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def parse(self, raw):
+        """raw is a line of NDJSON, or the values of a CSV record."""
+        if self.fmt == "ndjson":
+            record = json.loads(raw)
+            if not isinstance(record, dict):
+                raise ValueError("Expected a JSON object")
+            return record
+
+        values = raw
+        if self.header is None:
+            missing = set(CSV_COLUMNS) - set(values)
+            if missing:
+                raise ValueError(f"CSV header is missing {', '.join(sorted(missing))}")
+            self.header = values
+            return None
+
+        if len(values) != len(self.header):
+            raise ValueError(f"Expected {len(self.header)} columns, got {len(values)}")
+        record = dict(zip(self.header, values))
+        for column in CSV_LIST_COLUMNS:
+            record[column] = [
+                value.strip()
+                for value in record[column].split(CSV_LIST_SEPARATOR)
+                if value.strip()
+            ]
+        return {column: record[column] for column in CSV_COLUMNS}
+
+    def error(self, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": self.record_line, "error": message})
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        target, extra = copy_target(self.table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(row + extra for row in self.rows)
+        buffer.seek(0)
+
+        cursor = self.conn.cursor()
+        cursor.copy_expert(f"COPY {target} FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.close()
+        if not self.conn.autocommit:
+            self.conn.commit()
+
+        self.imported += len(self.rows)
+        self.rows = []
+
+    def finish(self):
+        if self.csv_lines.lines:
+            self.record_line = self.csv_reader.line_num + 1
+            self.error("Quoted field is never closed")
+            self.csv_lines.lines.clear()
+        self.flush()
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def main():
+    from app import SongCreate
+
+    parser = argparse.ArgumentParser(
+        description="Stream songs from an NDJSON or CSV file into the database."
+    )
+    parser.add_argument("file", help="path to the file, or - for stdin")
+    parser.add_argument("--format", choices=("ndjson", "csv"))
+    parser.add_argument("--table", choices=("songs", "todo_songs"), default="songs")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.file.lower().endswith(".csv") else "ndjson"
+
+    conn = psycopg2.connect(db_connection_string)
+    conn.autocommit = True
+    importer = SongImporter(conn, args.table, SongCreate, fmt, args.chunk_size)
+
+    if args.file == "-":
+        importer.feed_lines(sys.stdin)
+    else:
+        with open(args.file, encoding="utf-8", newline="") as f:
+            importer.feed_lines(f)
+
+    result = importer.finish()
+    conn.close()
+
+    for error in result["errors"]:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    if result["failed"] > len(result["errors"]):
+        print(
+            f"... and {result['failed'] - len(result['errors'])} more errors",
+            file=sys.stderr,
+        )
+    print(
+        f"Imported {result['imported']} songs into {args.table}, "
+        f"{result['failed']} lines failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
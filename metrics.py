@@ -0,0 +1,238 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+
+from psycopg2.extras import RealDictCursor
+
+# Seconds, tuned for requests and queries from sub-millisecond to seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{format_labels(self.labels, label_values)} {value}"
+                )
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted(
+                (label_values, list(series))
+                for label_values, series in self._series.items()
+            )
+        for label_values, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = format_labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels + ("le",), label_values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "songlist_http_request_duration_seconds",
+    "Time to answer a request, by route and status.",
+    ("method", "route", "status"),
+)
+request_db_queries = Histogram(
+    "songlist_request_db_queries",
+    "Database statements run per request.",
+    ("route",),
+    COUNT_BUCKETS,
+)
+request_db_duration = Histogram(
+    "songlist_request_db_duration_seconds",
+    "Time spent in database statements per request.",
+    ("route",),
+)
+db_rows = Counter(
+    "songlist_db_rows_total", "Rows returned or affected by statements.", ("route",)
+)
+pool_acquire_duration = Histogram(
+    "songlist_pool_acquire_seconds", "Time to check a connection out of the pool."
+)
+
+REGISTRY = [
+    http_request_duration,
+    request_db_queries,
+    request_db_duration,
+    db_rows,
+    pool_acquire_duration,
+]
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time", "rows")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+
+# Stats of the request being handled; FastAPI copies the context into the
+# threadpool, so cursors used by sync routes update the same object
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def route_label(scope):
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def record_query(cursor, query, params, elapsed):
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+    slow_log = TimedCursor.slow_log
+    if slow_log is not None:
+        endpoint = route_label(stats.scope) if stats is not None else None
+        slow_log.observe(cursor, query, params, elapsed, endpoint)
+
+
+class TimedCursor(RealDictCursor):
+    """
+    RealDictCursor that charges each statement to the current request, and
+    reports it to slow_log (a slowlog.SlowQueryLog) when one is set.
+    """
+
+    slow_log = None
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(self, query, vars, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(self, sql, None, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Routes are labelled by
+    their path template, so /songs/{song_uuid} is one series, not one per
+    song.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = route_label(scope)
+            http_request_duration.observe(elapsed, scope["method"], route, status)
+            request_db_queries.observe(stats.queries, route)
+            if stats.queries:
+                request_db_duration.observe(stats.db_time, route)
+                db_rows.inc(route, amount=stats.rows)
+
+
+def render(values=None):
+    """
+    Prometheus text exposition of every metric, plus values: name -> (type,
+    value) for gauges and counters that are read at scrape time.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, (kind, value) in (values or {}).items():
+        lines.extend([f"# TYPE {name} {kind}", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
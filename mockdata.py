@@ -1,9 +1,17 @@
+import io
 import os
+import csv
+import bisect
+import json
+import time
 import uuid
 import random
+import argparse
+import itertools
+import multiprocessing
 import psycopg2
-from psycopg2.extras import Json
 from dotenv import load_dotenv
+from table import STORAGE_TABLES, copy_target, create_schema
 
 # Load environment variables
 load_dotenv()
@@ -194,108 +202,164 @@ sample_links = [
 ]
 
 
-def generate_song():
-    """Generate a random song with mock data"""
+def zipf_weights(count, skew):
+    """Cumulative weights giving the item of rank r a share of 1 / r**skew."""
+    return list(itertools.accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+def weighted_sample(rng, items, cum_weights, k):
+    """Pick k distinct items, each draw weighted by cum_weights."""
+    if cum_weights is None:
+        return rng.sample(items, k)
+    total = cum_weights[-1]
+    chosen = []
+    while len(chosen) < k:
+        item = items[bisect.bisect(cum_weights, rng.random() * total)]
+        if item not in chosen:
+            chosen.append(item)
+    return chosen
+
+
+def generate_song(rng=random, singer_weights=None, tag_weights=None, name=None):
+    """
+    Make one mock song. Singers and tags are picked uniformly unless
+    cumulative weights (see zipf_weights) are given for them.
+    """
     # Pick 1-3 singers
-    num_singers = random.randint(1, 3)
-    singers = random.sample(sample_singers, num_singers)
+    num_singers = rng.randint(1, 3)
+    singers = weighted_sample(rng, sample_singers, singer_weights, num_singers)
 
     # Pick 1-6 tags
-    num_tags = random.randint(1, 6)
-    tags = random.sample(sample_tags, num_tags)
+    num_tags = rng.randint(1, 6)
+    tags = weighted_sample(rng, sample_tags, tag_weights, num_tags)
 
     # Pick 1-4 links
-    num_links = random.randint(1, 4)
-    links = random.sample(sample_links, num_links)
+    num_links = rng.randint(1, 4)
+    links = rng.sample(sample_links, num_links)
 
     return {
-        "name": random.choice(sample_song_names),
+        "name": name or rng.choice(sample_song_names),
         "singers": singers,
         "tags": tags,
         "links": links,
     }
 
 
-def insert_mock_data(num_songs=20, num_todo_songs=15):
-    """Insert mock data into the database"""
+def copy_chunk(job):
+    """
+    Generate one chunk of songs and COPY it into its table. Runs in a worker
+    process. Every song has its own seed, so the data does not depend on
+    the chunk size, the number of processes or the order chunks finish in.
+    """
+    table, start, count, seed, skew, unique_names = job
+    rng = random.Random()
+    singer_weights = zipf_weights(len(sample_singers), skew) if skew else None
+    tag_weights = zipf_weights(len(sample_tags), skew) if skew else None
+
+    target, extra = copy_target(table)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for index in range(start, start + count):
+        rng.seed(f"{seed}:{table}:{index}")
+        name = None
+        if unique_names:
+            name = f"{rng.choice(sample_song_names)} #{index + 1}"
+        song = generate_song(rng, singer_weights, tag_weights, name)
+        song_uuid = uuid.UUID(int=rng.getrandbits(128), version=4)
+        writer.writerow((str(song_uuid), json.dumps(song)) + extra)
+    buffer.seek(0)
+
     conn = psycopg2.connect(db_connection_string)
     conn.autocommit = True
     cursor = conn.cursor()
-
-    # Insert songs
-    print(f"Inserting {num_songs} songs into 'songs' table...")
-    for _ in range(num_songs):
-        song_data = generate_song()
-        song_uuid = str(uuid.uuid4())
-        cursor.execute(
-            "INSERT INTO songs (uuid, data) VALUES (%s, %s)",
-            (song_uuid, Json(song_data)),
-        )
-
-    # Insert todo songs
-    print(f"Inserting {num_todo_songs} songs into 'todo_songs' table...")
-    for _ in range(num_todo_songs):
-        song_data = generate_song()
-        song_uuid = str(uuid.uuid4())
-        cursor.execute(
-            "INSERT INTO todo_songs (uuid, data) VALUES (%s, %s)",
-            (song_uuid, Json(song_data)),
-        )
-
+    cursor.copy_expert(f"COPY {target} FROM STDIN WITH (FORMAT csv)", buffer)
     cursor.close()
     conn.close()
+    return count
 
-    print("Mock data insertion complete!")
 
+def load_mock_data(table, num_songs, seed, skew, unique_names, processes, chunk_size):
+    """Load num_songs generated songs into table and return rows per second."""
+    jobs = [
+        (table, start, min(chunk_size, num_songs - start), seed, skew, unique_names)
+        for start in range(0, num_songs, chunk_size)
+    ]
 
-if __name__ == "__main__":
-    # Check if tables exist, create them if they don't
-    conn = psycopg2.connect(db_connection_string)
-    cursor = conn.cursor()
+    started = time.perf_counter()
+    loaded = 0
+    with multiprocessing.Pool(processes) as pool:
+        for count in pool.imap_unordered(copy_chunk, jobs):
+            loaded += count
+            rate = loaded / (time.perf_counter() - started)
+            print(f"\r{table}: {loaded}/{num_songs} rows, {rate:.0f} rows/s", end="")
+    elapsed = time.perf_counter() - started
+    print()
+    return num_songs / elapsed if elapsed else 0.0
 
-    # Create songs table if not exists
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS songs (
-        uuid UUID PRIMARY KEY,
-        data JSONB NOT NULL
-    );
-    """)
 
-    # Create todo_songs table if not exists
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS todo_songs (
-        uuid UUID PRIMARY KEY,
-        data JSONB NOT NULL
-    );
-    """)
+def main():
+    from app import CHANGES_CHANNEL
 
-    # Check if tables already have data
-    cursor.execute("SELECT COUNT(*) FROM songs")
-    songs_count = cursor.fetchone()[0]
-    cursor.execute("SELECT COUNT(*) FROM todo_songs")
-    todo_count = cursor.fetchone()[0]
+    parser = argparse.ArgumentParser(
+        description="Fill the songs and todo_songs tables with generated songs."
+    )
+    parser.add_argument("--songs", type=int, default=30)
+    parser.add_argument("--todo-songs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--skew",
+        type=float,
+        default=1.0,
+        help="Zipf exponent for singer and tag popularity, 0 for uniform",
+    )
+    parser.add_argument(
+        "--unique-names", action="store_true", help="number every song name"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=os.cpu_count(), help="generator processes"
+    )
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument(
+        "--truncate", action="store_true", help="clear both tables first"
+    )
+    args = parser.parse_args()
 
+    # Create songs and todo_songs tables if not exists
+    conn = psycopg2.connect(db_connection_string)
+    cursor = conn.cursor()
+    create_schema(cursor)
+    if args.truncate:
+        # TRUNCATE skips the row triggers, so do their bookkeeping here
+        cursor.execute(f"TRUNCATE {', '.join(STORAGE_TABLES)}")
+        cursor.execute("DELETE FROM song_facets")
+        cursor.execute("UPDATE song_list_versions SET version = version + 1")
     conn.commit()
+
+    for table, num_songs in (("songs", args.songs), ("todo_songs", args.todo_songs)):
+        if num_songs <= 0:
+            continue
+        rate = load_mock_data(
+            table,
+            num_songs,
+            args.seed,
+            args.skew,
+            args.unique_names,
+            args.processes,
+            args.chunk_size,
+        )
+        print(f"Inserted {num_songs} songs into '{table}' at {rate:.0f} rows/s")
+
+    # Fresh statistics, so the planner sees the new table sizes right away
+    conn.autocommit = True
+    for table in STORAGE_TABLES:
+        cursor.execute(f"ANALYZE {table}")
+    # COPY sends no change notifications; tell running servers to resync
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANGES_CHANNEL, '{"op": "reset"}'))
     cursor.close()
     conn.close()
 
-    if songs_count > 0 or todo_count > 0:
-        print(f"Found existing data: {songs_count} songs, {todo_count} todo songs")
-        response = input(
-            "Would you like to clear existing data before adding mock data? (y/n): "
-        )
-        if response.lower() == "y":
-            conn = psycopg2.connect(db_connection_string)
-            conn.autocommit = True
-            cursor = conn.cursor()
-            cursor.execute("TRUNCATE songs, todo_songs")
-            cursor.close()
-            conn.close()
-            print("Existing data cleared.")
-            insert_mock_data(30, 20)
-        else:
-            print("Adding mock data to existing tables...")
-            insert_mock_data(30, 20)
-    else:
-        # Insert mock data
-        insert_mock_data(30, 20)
+    print("Mock data insertion complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Connections are opened lazily up to max_size, pinged on checkout when they
+    have been idle for longer than check_after seconds, and closed instead of
+    being returned once they have been used max_uses times or are older than
+    max_age seconds.
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size=1,
+        max_size=10,
+        timeout=5.0,
+        check_after=30.0,
+        max_uses=1000,
+        max_age=1800.0,
+    ):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_uses = max_uses
+        self.max_age = max_age
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, last_used)
+        self._info = {}  # id(conn) -> [created_at, uses]
+        self._size = 0
+        self._closed = False
+
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._opened = 0
+        self._discarded = 0
+
+    def fill(self):
+        """Open connections until min_size are available."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"No connection available within {self.timeout}s"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                conn = self._open()
+            elif not self._healthy(conn, last_used):
+                self._discard(conn)
+                continue
+
+            self._info[id(conn)][1] += 1
+            wait_time = time.monotonic() - start
+            with self._cond:
+                self._acquired += 1
+                if waited:
+                    self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait = max(self._max_wait, wait_time)
+            return conn
+
+    def putconn(self, conn):
+        created_at, uses = self._info[id(conn)]
+
+        if not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                pass
+
+        if (
+            conn.closed
+            or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE
+            or uses >= self.max_uses
+            or time.monotonic() - created_at >= self.max_age
+        ):
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if self._closed:
+                close = True
+            else:
+                close = False
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if close:
+            self._discard(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "in_use": self._size - idle,
+                "idle": idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_time_total": self._wait_time,
+                "wait_time_max": self._max_wait,
+                "wait_time_avg": (
+                    self._wait_time / self._acquired if self._acquired else 0.0
+                ),
+                "opened": self._opened,
+                "discarded": self._discarded,
+            }
+
+    def _open(self):
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._info[id(conn)] = [time.monotonic(), 0]
+        with self._cond:
+            self._opened += 1
+        return conn
+
+    def _healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - self._info[id(conn)][0] >= self.max_age:
+            return False
+        if now - last_used < self.check_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._info.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
@@ -0,0 +1,119 @@
+import time
+import random
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.extras import Json
+
+MAX_STATEMENT_LENGTH = 2000
+
+
+def param_shape(value):
+    """Describe a query parameter without revealing its value."""
+    if value is None:
+        return "null"
+    if isinstance(value, Json):
+        return "json"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def params_shape(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: param_shape(value) for key, value in params.items()}
+    return [param_shape(value) for value in params]
+
+
+class SlowQueryLog:
+    """
+    Bounded ring buffer of statements slower than threshold seconds. A
+    sampled fraction of slow SELECTs is run again under EXPLAIN (ANALYZE,
+    BUFFERS) inside a transaction that is rolled back, to capture the plan.
+    """
+
+    def __init__(self, threshold, explain_rate=0.1, size=100):
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.size = size
+
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=size)
+        self.recorded = 0
+
+    def observe(self, cursor, query, params, elapsed, endpoint):
+        if elapsed < self.threshold:
+            return
+
+        if isinstance(query, bytes):
+            query = query.decode(errors="replace")
+        statement = str(query).strip()
+        entry = {
+            "at": time.time(),
+            "duration_ms": elapsed * 1000,
+            "endpoint": endpoint,
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "params": params_shape(params),
+            "rows": cursor.rowcount,
+            "plan": None,
+        }
+        if random.random() < self.explain_rate:
+            entry["plan"] = self.explain(cursor, statement, params)
+
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+    def explain(self, cursor, statement, params):
+        """
+        Return the plan of statement, or None if it cannot be re-run safely:
+        only plain SELECTs on unnamed cursors, outside a failed transaction.
+        Outside a transaction the EXPLAIN runs in a read-only one; inside
+        one, under a savepoint. Either is rolled back, which undoes anything
+        the statement did, including notifications.
+        """
+        conn = cursor.connection
+        status = conn.get_transaction_status()
+        if status == TRANSACTION_STATUS_IDLE:
+            begin, end = "BEGIN READ ONLY", ["ROLLBACK"]
+        elif status == TRANSACTION_STATUS_INTRANS:
+            begin = "SAVEPOINT slowlog_explain"
+            end = ["ROLLBACK TO SAVEPOINT slowlog_explain", "RELEASE slowlog_explain"]
+        else:
+            return None
+        if cursor.name is not None or not statement[:6].upper() == "SELECT":
+            return None
+
+        # A plain cursor, so the EXPLAIN is neither timed nor logged itself
+        explain_cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+        try:
+            explain_cursor.execute(begin)
+            explain_cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", params)
+            return "\n".join(row[0] for row in explain_cursor.fetchall())
+        except psycopg2.Error as e:
+            return f"EXPLAIN failed: {e}".strip()
+        finally:
+            # Executed rather than conn.rollback(), which does nothing on an
+            # autocommit connection and would leave the transaction open
+            try:
+                for command in end:
+                    explain_cursor.execute(command)
+            except psycopg2.Error:
+                # A broken connection; the pool discards it on checkout
+                pass
+            explain_cursor.close()
+
+    def entries(self):
+        """Newest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,149 @@
+import time
+import threading
+
+
+class Flight:
+    """One loader call, shared by every get() that misses while it runs."""
+
+    __slots__ = ("generation", "done", "finished_at", "value", "error")
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.finished_at = None
+        self.value = None
+        self.error = None
+
+
+class SnapshotCache:
+    """
+    Per-worker cache of whole-table reads. An entry is built lazily by the
+    loader passed to get(), dropped by invalidate(), and rebuilt once it is
+    older than max_age seconds even if no invalidation arrives. A max_age of
+    0 disables caching.
+
+    With coalesce set, a get() that misses while another thread is already
+    loading the same key waits for that load instead of starting its own, and
+    so does one arriving up to coalesce_window seconds after it finished.
+    Either way the load must have started after the last invalidation.
+    """
+
+    def __init__(self, max_age, coalesce=True, coalesce_window=0.0):
+        self.max_age = max_age
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (value, built_at)
+        self._generations = {}  # key -> number of invalidations so far
+        self._resets = 0  # invalidations of every key, known or not
+        self._flights = {}  # key -> latest Flight
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.rebuild_time_total = 0.0
+        self.rebuild_time_max = 0.0
+
+    def get(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation(key)
+            if entry is not None and time.monotonic() - entry[1] < self.max_age:
+                self.hits += 1
+                return entry[0]
+
+            flight = self._flights.get(key)
+            leader = not self._joinable(flight, generation)
+            if leader:
+                self.misses += 1
+                flight = Flight(generation)
+                if self.coalesce:
+                    self._flights[key] = flight
+            else:
+                self.coalesced += 1
+
+        if leader:
+            return self._load(key, loader, flight)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _generation(self, key):
+        return self._resets, self._generations.get(key, 0)
+
+    def _joinable(self, flight, generation):
+        if flight is None or flight.generation != generation:
+            return False
+        if not flight.done.is_set():
+            return True
+        return time.monotonic() - flight.finished_at < self.coalesce_window
+
+    def _load(self, key, loader, flight):
+        # Entries age on the monotonic clock; perf_counter only times the load
+        built_at = time.monotonic()
+        start = time.perf_counter()
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            flight.finished_at = time.monotonic()
+            flight.done.set()
+
+            with self._lock:
+                self.rebuild_time_total += elapsed
+                self.rebuild_time_max = max(self.rebuild_time_max, elapsed)
+                if flight.error is not None:
+                    # A failed load is not shared with later callers
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                # A write that landed while we were loading may not be in value
+                elif self.max_age > 0 and self._generation(key) == flight.generation:
+                    self._entries[key] = (flight.value, built_at)
+        return flight.value
+
+    def peek(self, key):
+        """Return the cached value for key if it is fresh, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.max_age:
+                self.hits += 1
+                return entry[0]
+        return None
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or every entry when called without keys."""
+        with self._lock:
+            self.invalidations += 1
+            if not keys:
+                # Also covers keys whose first load is still running
+                self._resets += 1
+                self._entries.clear()
+                self._flights.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+                self._flights.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "coalesce_window": self.coalesce_window if self.coalesce else None,
+                "invalidations": self.invalidations,
+                "rebuild_time_total": self.rebuild_time_total,
+                "rebuild_time_max": self.rebuild_time_max,
+                "rebuild_time_avg": (
+                    self.rebuild_time_total / self.misses if self.misses else 0.0
+                ),
+            }
@@ -1,4 +1,5 @@
 import os
+import sys
 import psycopg2
 from dotenv import load_dotenv
 
@@ -8,16 +9,36 @@ load_dotenv()
 # Get database connection string from environment variables
 db_connection_string = os.getenv("DATABASE_URL")
 
+# "split" keeps each list in its own table. "unified" keeps both in
+# song_entries with a status column naming the list, and each list is a
+# view of it, so reads are written the same way against either schema.
+SCHEMA = os.getenv("SONGLIST_SCHEMA", "split")
+LISTS = ("songs", "todo_songs")
+UNIFIED_TABLE = "song_entries"
+# The tables that actually hold rows, for TRUNCATE and ANALYZE
+STORAGE_TABLES = (UNIFIED_TABLE,) if SCHEMA == "unified" else LISTS
+
+
+def copy_target(table):
+    """
+    Return the COPY target for loading (uuid, data) rows into a list, and
+    the values to append to every row. COPY cannot load a view, so in the
+    unified schema rows go to song_entries with their status.
+    """
+    if SCHEMA == "unified":
+        return f"{UNIFIED_TABLE} (uuid, data, status)", (table,)
+    return f"{table} (uuid, data)", ()
+
 
 def drop_all_tables(conn, cur):
     """
     Drop all tables in the database.
     """
-    # Get a list of all tables in the database
+    # Get a list of all tables in the database; views go with their tables
     cur.execute("""
         SELECT table_name
         FROM information_schema.tables
-        WHERE table_schema = 'public';
+        WHERE table_schema = 'public' AND table_type = 'BASE TABLE';
     """)
     tables = cur.fetchall()
 
@@ -31,32 +52,498 @@ def drop_all_tables(conn, cur):
     conn.commit()
 
 
-def create_tables():
-    # Connect to the PostgreSQL database
-    conn = psycopg2.connect(db_connection_string)
-
-    # Create a cursor object
-    cur = conn.cursor()
+def create_schema(cur):
+    """
+    Create the songs and todo_songs lists and their indexes, in the layout
+    SCHEMA selects. Every statement is idempotent, so this also upgrades an
+    existing database in place, including from split to unified.
+    """
+    # Trigram operator classes for substring search on names
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
 
-    # Drop all existing tables
-    drop_all_tables(conn, cur)
+    # Change tracking: every row remembers the transaction that last wrote it,
+    # and deleted rows leave a tombstone, so /changes can return deltas
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS song_tombstones (
+        table_name TEXT NOT NULL,
+        uuid UUID NOT NULL,
+        deleted_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        change_xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+        PRIMARY KEY (table_name, uuid)
+    );
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS song_tombstones_change_idx
+        ON song_tombstones (change_xid);
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_touch() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at := now();
+        NEW.change_xid := pg_current_xact_id();
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_bury() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO song_tombstones (table_name, uuid)
+        SELECT TG_TABLE_NAME, uuid FROM old_rows
+        ON CONFLICT (table_name, uuid) DO UPDATE
+            SET deleted_at = EXCLUDED.deleted_at, change_xid = EXCLUDED.change_xid;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_unbury() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM song_tombstones t
+        USING new_rows n
+        WHERE t.table_name = TG_TABLE_NAME AND t.uuid = n.uuid;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
 
-    # Create songs table
+    # One counter per list, bumped by every statement that changes rows; the
+    # list endpoints serve it as their ETag
     cur.execute("""
-    CREATE TABLE songs (
-        uuid UUID PRIMARY KEY,
-        data JSONB NOT NULL
+    CREATE TABLE IF NOT EXISTS song_list_versions (
+        table_name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 1
     );
     """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_list_bump() RETURNS trigger AS $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM changed_rows) THEN
+            UPDATE song_list_versions SET version = version + 1
+            WHERE table_name = TG_TABLE_NAME;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
 
-    # Create todo_songs table
+    # Song counts per tag and per singer, so facets are read without
+    # scanning the songs. Maintained by song_count_facets.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS song_facets (
+        table_name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        song_count INTEGER NOT NULL,
+        PRIMARY KEY (table_name, kind, value)
+    );
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS song_facets_empty_idx
+        ON song_facets (table_name) WHERE song_count <= 0;
+    """)
     cur.execute("""
-    CREATE TABLE todo_songs (
+    CREATE OR REPLACE FUNCTION song_count_facets() RETURNS trigger AS $$
+    DECLARE
+        added JSONB := '[]';
+        removed JSONB := '[]';
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT coalesce(jsonb_agg(data), '[]') INTO added FROM new_rows;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            SELECT coalesce(jsonb_agg(data), '[]') INTO removed FROM old_rows;
+        END IF;
+
+        -- Net change per facet; sorted so concurrent writers lock in order
+        INSERT INTO song_facets (table_name, kind, value, song_count)
+        SELECT TG_TABLE_NAME, f.kind, f.value, sum(c.delta)
+        FROM (
+            SELECT doc, 1 AS delta FROM jsonb_array_elements(added) doc
+            UNION ALL
+            SELECT doc, -1 FROM jsonb_array_elements(removed) doc
+        ) c
+        CROSS JOIN LATERAL (
+            SELECT 'tag' AS kind, value FROM jsonb_array_elements_text(c.doc->'tags')
+            UNION ALL
+            SELECT 'singer', value FROM jsonb_array_elements_text(c.doc->'singers')
+        ) f
+        GROUP BY f.kind, f.value
+        HAVING sum(c.delta) <> 0
+        ORDER BY f.kind, f.value
+        ON CONFLICT (table_name, kind, value) DO UPDATE
+            SET song_count = song_facets.song_count + EXCLUDED.song_count;
+
+        DELETE FROM song_facets
+        WHERE table_name = TG_TABLE_NAME AND song_count <= 0;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+
+    if SCHEMA == "unified":
+        create_unified_tables(cur)
+    else:
+        create_split_tables(cur)
+
+
+def create_split_tables(cur):
+    for table in LISTS:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            uuid UUID PRIMARY KEY,
+            data JSONB NOT NULL
+        );
+        """)
+        cur.execute(f"""
+        ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now();
+        """)
+        # Bumped on every update, for optimistic concurrency control
+        cur.execute(f"""
+        ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+        """)
+        cur.execute(f"""
+        ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            ADD COLUMN IF NOT EXISTS change_xid XID8 NOT NULL
+                DEFAULT pg_current_xact_id();
+        """)
+
+        # Inserts get updated_at and change_xid from the defaults, updates
+        # from song_touch; deletes and re-inserts maintain the tombstones
+        cur.execute(f"""
+        DROP TRIGGER IF EXISTS {table}_touch ON {table};
+        CREATE TRIGGER {table}_touch
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION song_touch();
+        """)
+        cur.execute(f"""
+        DROP TRIGGER IF EXISTS {table}_bury ON {table};
+        CREATE TRIGGER {table}_bury
+            AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION song_bury();
+        """)
+        cur.execute(f"""
+        DROP TRIGGER IF EXISTS {table}_unbury ON {table};
+        CREATE TRIGGER {table}_unbury
+            AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION song_unbury();
+        """)
+
+        # A statement that matches no rows leaves the version alone, so
+        # each event needs its own trigger for the transition table
+        cur.execute(f"""
+        INSERT INTO song_list_versions (table_name) VALUES ('{table}')
+        ON CONFLICT (table_name) DO NOTHING;
+        """)
+        for event, rows in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+            cur.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_bump_{event} ON {table};
+            CREATE TRIGGER {table}_bump_{event}
+                AFTER {event.upper()} ON {table}
+                REFERENCING {rows} TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION song_list_bump();
+            """)
+
+        # Facet counts: one trigger per event, since a trigger with
+        # transition tables can only fire on one
+        for event, rows in (
+            ("insert", "NEW TABLE AS new_rows"),
+            ("update", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("delete", "OLD TABLE AS old_rows"),
+        ):
+            cur.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_facets_{event} ON {table};
+            CREATE TRIGGER {table}_facets_{event}
+                AFTER {event.upper()} ON {table}
+                REFERENCING {rows}
+                FOR EACH STATEMENT EXECUTE FUNCTION song_count_facets();
+            """)
+        # Recount from scratch, which also fills the table on first migration
+        cur.execute(f"""
+        DELETE FROM song_facets WHERE table_name = '{table}';
+        INSERT INTO song_facets (table_name, kind, value, song_count)
+        SELECT '{table}', f.kind, f.value, count(*)
+        FROM {table} s
+        CROSS JOIN LATERAL (
+            SELECT 'tag' AS kind, value FROM jsonb_array_elements_text(s.data->'tags')
+            UNION ALL
+            SELECT 'singer', value FROM jsonb_array_elements_text(s.data->'singers')
+        ) f
+        GROUP BY f.kind, f.value;
+        """)
+
+        # Sort keys for keyset pagination
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_name_idx
+            ON {table} ((data->>'name'), uuid);
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_created_idx
+            ON {table} (created_at, uuid);
+        """)
+
+        # Change feed
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_change_idx
+            ON {table} (change_xid);
+        """)
+
+        # Search: containment on singers and tags, substring on names
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_singers_idx
+            ON {table} USING GIN ((data->'singers') jsonb_path_ops);
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_tags_idx
+            ON {table} USING GIN ((data->'tags') jsonb_path_ops);
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx
+            ON {table} USING GIN ((data->>'name') gin_trgm_ops);
+        """)
+
+
+def create_unified_tables(cur):
+    """
+    Keep both lists in song_entries, with a partial index per list for every
+    index the split schema has, and expose each list as a view. Rows of an
+    existing split schema are moved over and its tables dropped.
+    """
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {UNIFIED_TABLE} (
         uuid UUID PRIMARY KEY,
-        data JSONB NOT NULL
+        status TEXT NOT NULL CHECK (status IN ('songs', 'todo_songs')),
+        data JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        version INTEGER NOT NULL DEFAULT 1,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        change_xid XID8 NOT NULL DEFAULT pg_current_xact_id()
     );
     """)
 
+    # Bookkeeping is keyed by list, as in the split schema, so the list of a
+    # row comes from its status instead of TG_TABLE_NAME. A status change is
+    # a move: the song leaves one list and joins the other.
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_entry_bury() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO song_tombstones (table_name, uuid)
+            SELECT status, uuid FROM old_rows
+            ON CONFLICT (table_name, uuid) DO UPDATE
+                SET deleted_at = EXCLUDED.deleted_at,
+                    change_xid = EXCLUDED.change_xid;
+        ELSE
+            INSERT INTO song_tombstones (table_name, uuid)
+            SELECT o.status, o.uuid
+            FROM old_rows o JOIN new_rows n ON n.uuid = o.uuid
+            WHERE n.status <> o.status
+            ON CONFLICT (table_name, uuid) DO UPDATE
+                SET deleted_at = EXCLUDED.deleted_at,
+                    change_xid = EXCLUDED.change_xid;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_entry_unbury() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM song_tombstones t
+        USING new_rows n
+        WHERE t.table_name = n.status AND t.uuid = n.uuid;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_entry_bump() RETURNS trigger AS $$
+    DECLARE
+        lists TEXT[] := '{}';
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            lists := lists || (SELECT array_agg(DISTINCT status) FROM new_rows);
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            lists := lists || (SELECT array_agg(DISTINCT status) FROM old_rows);
+        END IF;
+        UPDATE song_list_versions SET version = version + 1
+        WHERE table_name = ANY(lists);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION song_entry_count_facets() RETURNS trigger AS $$
+    DECLARE
+        added JSONB := '[]';
+        removed JSONB := '[]';
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT coalesce(jsonb_agg(jsonb_build_object('list', status, 'doc', data)), '[]')
+            INTO added FROM new_rows;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            SELECT coalesce(jsonb_agg(jsonb_build_object('list', status, 'doc', data)), '[]')
+            INTO removed FROM old_rows;
+        END IF;
+
+        -- Net change per list and facet; sorted so concurrent writers lock in order
+        INSERT INTO song_facets (table_name, kind, value, song_count)
+        SELECT c.list, f.kind, f.value, sum(c.delta)
+        FROM (
+            SELECT e->>'list' AS list, e->'doc' AS doc, 1 AS delta
+            FROM jsonb_array_elements(added) e
+            UNION ALL
+            SELECT e->>'list', e->'doc', -1 FROM jsonb_array_elements(removed) e
+        ) c
+        CROSS JOIN LATERAL (
+            SELECT 'tag' AS kind, value FROM jsonb_array_elements_text(c.doc->'tags')
+            UNION ALL
+            SELECT 'singer', value FROM jsonb_array_elements_text(c.doc->'singers')
+        ) f
+        GROUP BY c.list, f.kind, f.value
+        HAVING sum(c.delta) <> 0
+        ORDER BY c.list, f.kind, f.value
+        ON CONFLICT (table_name, kind, value) DO UPDATE
+            SET song_count = song_facets.song_count + EXCLUDED.song_count;
+
+        DELETE FROM song_facets WHERE song_count <= 0;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Move the rows of a split schema over; a song in both lists keeps its
+    # songs copy, as update_song_data prefers songs
+    cur.execute(
+        """
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = current_schema() AND table_type = 'BASE TABLE'
+            AND table_name = ANY(%s)
+        """,
+        (list(LISTS),),
+    )
+    split_tables = {row[0] for row in cur.fetchall()}
+    for table in LISTS:
+        if table not in split_tables:
+            continue
+        cur.execute(f"""
+        INSERT INTO {UNIFIED_TABLE}
+            (uuid, status, data, created_at, version, updated_at, change_xid)
+        SELECT uuid, '{table}', data, created_at, version, updated_at, change_xid
+        FROM {table}
+        ON CONFLICT (uuid) DO NOTHING;
+        """)
+        print(f"Moved {cur.rowcount} songs from {table} to {UNIFIED_TABLE}")
+        cur.execute(f"DROP TABLE {table};")
+        cur.execute(f"""
+        UPDATE song_list_versions SET version = version + 1
+        WHERE table_name = '{table}';
+        """)
+
+    cur.execute(f"""
+    DROP TRIGGER IF EXISTS {UNIFIED_TABLE}_touch ON {UNIFIED_TABLE};
+    CREATE TRIGGER {UNIFIED_TABLE}_touch
+        BEFORE UPDATE ON {UNIFIED_TABLE}
+        FOR EACH ROW EXECUTE FUNCTION song_touch();
+    """)
+    # One trigger per event, since a trigger with transition tables can
+    # only fire on one
+    for event, rows, functions in (
+        ("insert", "NEW TABLE AS new_rows", ("unbury", "bump", "count_facets")),
+        (
+            "update",
+            "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+            ("bury", "unbury", "bump", "count_facets"),
+        ),
+        ("delete", "OLD TABLE AS old_rows", ("bury", "bump", "count_facets")),
+    ):
+        for function in functions:
+            cur.execute(f"""
+            DROP TRIGGER IF EXISTS {UNIFIED_TABLE}_{function}_{event} ON {UNIFIED_TABLE};
+            CREATE TRIGGER {UNIFIED_TABLE}_{function}_{event}
+                AFTER {event.upper()} ON {UNIFIED_TABLE}
+                REFERENCING {rows}
+                FOR EACH STATEMENT EXECUTE FUNCTION song_entry_{function}();
+            """)
+
+    for table in LISTS:
+        # Inserts through the view land in its list; updates and deletes
+        # only see rows of its list
+        cur.execute(f"""
+        CREATE OR REPLACE VIEW {table} AS
+            SELECT uuid, data, created_at, version, updated_at, change_xid, status
+            FROM {UNIFIED_TABLE}
+            WHERE status = '{table}';
+        ALTER VIEW {table} ALTER COLUMN status SET DEFAULT '{table}';
+        """)
+
+        cur.execute(f"""
+        INSERT INTO song_list_versions (table_name) VALUES ('{table}')
+        ON CONFLICT (table_name) DO NOTHING;
+        """)
+        cur.execute(f"""
+        DELETE FROM song_facets WHERE table_name = '{table}';
+        INSERT INTO song_facets (table_name, kind, value, song_count)
+        SELECT '{table}', f.kind, f.value, count(*)
+        FROM {table} s
+        CROSS JOIN LATERAL (
+            SELECT 'tag' AS kind, value FROM jsonb_array_elements_text(s.data->'tags')
+            UNION ALL
+            SELECT 'singer', value FROM jsonb_array_elements_text(s.data->'singers')
+        ) f
+        GROUP BY f.kind, f.value;
+        """)
+
+        # The same indexes as the split schema, one set per list; queries
+        # through the view carry its status condition, so the planner uses them
+        index = f"{UNIFIED_TABLE}_{table}"
+        where = f"WHERE status = '{table}'"
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index}_name_idx
+            ON {UNIFIED_TABLE} ((data->>'name'), uuid) {where};
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index}_created_idx
+            ON {UNIFIED_TABLE} (created_at, uuid) {where};
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index}_change_idx
+            ON {UNIFIED_TABLE} (change_xid) {where};
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index}_singers_idx
+            ON {UNIFIED_TABLE} USING GIN ((data->'singers') jsonb_path_ops) {where};
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index}_tags_idx
+            ON {UNIFIED_TABLE} USING GIN ((data->'tags') jsonb_path_ops) {where};
+        """)
+        cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index}_name_trgm_idx
+            ON {UNIFIED_TABLE} USING GIN ((data->>'name') gin_trgm_ops) {where};
+        """)
+
+
+def create_tables():
+    # Connect to the PostgreSQL database
+    conn = psycopg2.connect(db_connection_string)
+
+    # Create a cursor object
+    cur = conn.cursor()
+
+    # Drop all existing tables
+    drop_all_tables(conn, cur)
+
+    # Create songs and todo_songs tables
+    create_schema(cur)
+
     # Commit the transaction
     conn.commit()
 
@@ -67,5 +554,22 @@ def create_tables():
     print("Tables created successfully!")
 
 
+def migrate_tables():
+    conn = psycopg2.connect(db_connection_string)
+    cur = conn.cursor()
+
+    # Bring existing tables up to date without dropping data
+    create_schema(cur)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    print("Tables migrated successfully!")
+
+
 if __name__ == "__main__":
-    create_tables()
+    if "--migrate" in sys.argv[1:]:
+        migrate_tables()
+    else:
+        create_tables()